@@ -0,0 +1,77 @@
+import json
+import pickle
+import sqlite3
+import threading
+
+
+class PersistentCache:
+    """A key-value store backed by a SQLite file, safe to share between threads and runs.
+
+    Keys are JSON-serializable values (e.g. strings or tuples of strings); values are
+    pickled.
+
+    Args:
+        path (str, optional): Path of the SQLite file. If None, the cache lives in memory
+            and is not persisted.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._conn = sqlite3.connect(
+            path or ":memory:", timeout=60, check_same_thread=False
+        )
+        if path is not None:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _encode(key):
+        return json.dumps(key)
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE key = ?", (self._encode(key),)
+            ).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def get_many(self, keys):
+        """Return a dict from each cached key in `keys` to its value."""
+        encoded = {self._encode(key): key for key in keys}
+        found = {}
+        items = list(encoded)
+        with self._lock:
+            # Stay below SQLite's limit on the number of query parameters.
+            for i in range(0, len(items), 500):
+                chunk = items[i : i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for k, v in rows:
+                    found[encoded[k]] = pickle.loads(v)
+        return found
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        """Store every key-value pair of the dict `items`."""
+        rows = [(self._encode(k), pickle.dumps(v)) for k, v in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -6,8 +6,22 @@ from typing import Type, Callable
 from genlm.eval.core import Dataset, Evaluator, run_evaluation
 
 from .util import mean_ci_results
+from .evaluation import run_pipelined_evaluation
+from .profiling import MemoryProfiler
+from .resampling import register_resampling_methods
+from .potentials import parse_critic_schedule
 from . import models
 
+register_resampling_methods()
+
+
+def _validate_critic_schedule(ctx, param, value):
+    try:
+        parse_critic_schedule(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    return value
+
 
 def common_options(f):
     """Shared CLI options across all domains"""
@@ -74,7 +88,60 @@ def common_options(f):
         "--resampling-method",
         default=None,
         type=str,
-        help="Resampling method (for SMC models).",
+        help="Resampling method (for SMC models): multinomial, stratified, systematic or residual, or their NumPy-vectorized versions vectorized-multinomial, vectorized-stratified, vectorized-systematic or vectorized-residual.",
+    )(f)
+    f = click.option(
+        "--fast-forward",
+        is_flag=True,
+        help="Append grammar-forced tokens without sampling them, scoring each run of them with one batched LM call (for models with a fast potential). Forced spans are tokenized by greedy longest match, so this targets a different posterior than runs without it.",
+    )(f)
+    f = click.option(
+        "--critic-schedule",
+        default="token",
+        type=str,
+        callback=_validate_critic_schedule,
+        help="When the critic is evaluated during generation: 'token' (every token), 'boundary' (after domain-specific boundary bytes), 'every-K', or a comma-separated combination such as 'boundary,every-16'. The critic is always evaluated on complete sequences.",
+    )(f)
+    f = click.option(
+        "--critic-concurrency",
+        default=0,
+        type=int,
+        help="Maximum number of critic calls evaluated concurrently in a worker pool (0 evaluates them on the event loop).",
+    )(f)
+    f = click.option(
+        "--critic-executor",
+        default="thread",
+        type=click.Choice(["thread", "process"]),
+        help="Worker pool for concurrent critic calls (with --critic-concurrency).",
+    )(f)
+    f = click.option(
+        "--eval-workers",
+        default=0,
+        type=int,
+        help="Number of background threads scoring outputs while the next instances are generated (0 scores each output before moving on).",
+    )(f)
+    f = click.option(
+        "--eval-queue-size",
+        default=8,
+        type=int,
+        help="Maximum number of outputs waiting to be scored (with --eval-workers).",
+    )(f)
+    f = click.option(
+        "--memory-profile",
+        is_flag=True,
+        help="Record peak RSS (including child processes) and Python heap growth per instance in memory.jsonl in the output directory.",
+    )(f)
+    f = click.option(
+        "--memory-snapshot-every",
+        default=0,
+        type=int,
+        help="With --memory-profile, write tracemalloc top-allocation snapshots every N instances (0 disables snapshots).",
+    )(f)
+    f = click.option(
+        "--dataset-cache-dir",
+        default=None,
+        type=click.Path(file_okay=False),
+        help="Directory for preprocessed dataset snapshots, reused by later runs with the same loader arguments and source files.",
     )(f)
     f = click.option(
         "--max-instances",
@@ -159,12 +226,22 @@ def run_model_evaluation(
     prompt_formatter: Callable,
     max_instances: int = float("inf"),
     max_cache_size: int = 1,
+    eval_workers: int = 0,
+    eval_queue_size: int = 8,
+    memory_profile: bool = False,
+    memory_snapshot_every: int = 0,
     **kwargs,
 ):
     """Common evaluation logic across domains"""
     # default to multinomial resampling method, but this will not be used for models with ess_threshold=0.0 or n_particles=1
     resampling_method = resampling_method or "multinomial"
 
+    memory_profiler = None
+    if memory_profile:
+        memory_profiler = MemoryProfiler(
+            output_dir=output_dir, snapshot_every=memory_snapshot_every
+        )
+
     model = model_class(
         # Language model parameters
         lm_name=lm_name,
@@ -181,12 +258,14 @@ def run_model_evaluation(
         # Caching parameters
         cache_key_fn=cache_key_fn,
         max_cache_size=max_cache_size,
+        # Instrumentation
+        memory_profiler=memory_profiler,
         # Other parameters
         **kwargs,
     )
 
-    results = asyncio.run(
-        run_evaluation(
+    if eval_workers > 0:
+        evaluation = run_pipelined_evaluation(
             dataset=dataset,
             model=model,
             evaluator=evaluator,
@@ -196,10 +275,26 @@ def run_model_evaluation(
             overwrite_results=overwrite_results,
             overwrite_outputs=overwrite_outputs,
             output_dir=output_dir,
+            n_workers=eval_workers,
+            max_queue_size=eval_queue_size,
         )
-    )
+    else:
+        evaluation = run_evaluation(
+            dataset=dataset,
+            model=model,
+            evaluator=evaluator,
+            n_replicates=n_replicates,
+            verbosity=verbosity,
+            max_instances=max_instances,
+            overwrite_results=overwrite_results,
+            overwrite_outputs=overwrite_outputs,
+            output_dir=output_dir,
+        )
+    results = asyncio.run(evaluation)
 
     mean, lower, upper = mean_ci_results(results)
     print(f"Mean weighted accuracy: {mean}")
     print(f"95% CI: ({lower}, {upper})")
+    if memory_profiler is not None:
+        print(f"Peak RSS: {memory_profiler.peak_rss / 2**20:.1f} MB")
     return
@@ -0,0 +1,135 @@
+import os
+import json
+import mmap
+import pickle
+import struct
+import hashlib
+from array import array
+from genlm.eval.core import Dataset
+
+_MAGIC = b"GENLMDS1"
+_TRAILER = struct.Struct("<QQ")  # index offset, number of instances
+
+
+def _fingerprint(path):
+    """(path, size, mtime) of `path`, or of every file under it if it is a directory."""
+    path = os.path.abspath(path)
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return [(path, stat.st_size, stat.st_mtime_ns)]
+    entries = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            entries.append(
+                (
+                    os.path.relpath(os.path.join(root, name), path),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                )
+            )
+    return [(path, entries)]
+
+
+def snapshot_key(loader, args, kwargs, source_paths):
+    """Hash of a loader, its arguments, and the current state of its source files."""
+    description = {
+        "format": _MAGIC.decode(),
+        "loader": f"{loader.__module__}.{loader.__qualname__}",
+        "args": repr(args),
+        "kwargs": repr(sorted(kwargs.items())),
+        "sources": [_fingerprint(p) for p in source_paths],
+    }
+    return hashlib.sha256(json.dumps(description).encode()).hexdigest()[:16]
+
+
+def write_snapshot(dataset, path):
+    """Write the instances of `dataset` to `path` as a memory-mappable snapshot.
+
+    The file holds the pickled instances back to back, followed by the pickled
+    instance type, an array of instance offsets, and a fixed-size trailer.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    offsets = array("Q")
+    schema = getattr(dataset, "schema", None)
+    with open(tmp_path, "wb") as f:
+        f.write(_MAGIC)
+        for instance in dataset:
+            offsets.append(f.tell())
+            pickle.dump(instance, f, protocol=pickle.HIGHEST_PROTOCOL)
+            if schema is None:
+                schema = type(instance)
+        offsets.append(f.tell())
+        pickle.dump(schema, f, protocol=pickle.HIGHEST_PROTOCOL)
+        index_offset = f.tell()
+        offsets.tofile(f)
+        f.write(_TRAILER.pack(index_offset, len(offsets) - 1))
+    os.replace(tmp_path, path)
+
+
+class SnapshotDataset(Dataset):
+    """A dataset read lazily from a snapshot written by `write_snapshot`.
+
+    The file is memory-mapped and an instance is unpickled only when it is accessed,
+    so runs that stop early (e.g. with `--max-instances`) only touch the instances
+    they use.
+
+    Args:
+        path (str): Path of the snapshot file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"{path} is not a dataset snapshot")
+        index_offset, n = _TRAILER.unpack_from(
+            self._mmap, len(self._mmap) - _TRAILER.size
+        )
+        self._offsets = array("Q")
+        self._offsets.frombytes(self._mmap[index_offset : index_offset + 8 * (n + 1)])
+        self._schema = pickle.loads(self._mmap[self._offsets[n] : index_offset])
+
+    @property
+    def schema(self):
+        return self._schema
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        i %= len(self)
+        return pickle.loads(self._mmap[self._offsets[i] : self._offsets[i + 1]])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def load_dataset(loader, *args, cache_dir=None, source_paths=(), **kwargs):
+    """Call `loader(*args, **kwargs)`, going through a snapshot in `cache_dir` if given.
+
+    Snapshots are keyed by a hash of the loader, its arguments, and the size and
+    modification time of the files in `source_paths`, so changing any of them
+    rebuilds the snapshot on the next run.
+
+    Args:
+        loader (Callable): Function returning a `genlm.eval.Dataset`, e.g. `SpiderDataset.from_spider_dir`.
+        cache_dir (str, optional): Directory for snapshots. If None, `loader` is called directly.
+        source_paths (list[str]): Files or directories the loader reads from.
+
+    Returns:
+        (genlm.eval.Dataset): The dataset, as a `SnapshotDataset` if `cache_dir` is given.
+    """
+    if cache_dir is None:
+        return loader(*args, **kwargs)
+    os.makedirs(cache_dir, exist_ok=True)
+    key = snapshot_key(loader, args, kwargs, source_paths)
+    path = os.path.join(cache_dir, f"{loader.__qualname__}-{key}.snapshot")
+    if not os.path.exists(path):
+        write_snapshot(loader(*args, **kwargs), path)
+    return SnapshotDataset(path)
@@ -0,0 +1,133 @@
+import os
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from genlm.eval import ModelOutput
+
+
+def _score(evaluator, instance, output, results_path):
+    result = evaluator.evaluate_ensemble(instance, output)
+    if results_path is not None:
+        with open(results_path, "w") as f:
+            json.dump(result, f, indent=4)
+    return result
+
+
+async def run_pipelined_evaluation(
+    dataset,
+    model,
+    evaluator,
+    output_dir=None,
+    n_replicates=1,
+    overwrite_results=False,
+    overwrite_outputs=False,
+    max_instances=float("inf"),
+    verbosity=0,
+    n_workers=4,
+    max_queue_size=8,
+):
+    """Evaluate `model` on `dataset`, scoring outputs in the background while generating the next ones.
+
+    Behaves like `genlm.eval.run_evaluation` (same output and result files, same cached
+    output and result reuse, same return value), except that each finished `ModelOutput`
+    is handed to a pool of `n_workers` scoring threads instead of being scored before the
+    next generation starts. At most `max_queue_size` outputs wait to be scored; generation
+    pauses when the queue is full. All results are joined before returning.
+
+    Args:
+        dataset (genlm.eval.Dataset): Dataset to evaluate on.
+        model (Callable): Async model, called as `model(instance, output_dir, replicate=i)`.
+        evaluator (genlm.eval.Evaluator): Evaluator, called from worker threads.
+        output_dir (str, optional): Directory to write outputs and results to.
+        n_replicates (int): Number of runs of each instance.
+        overwrite_results (bool): Whether to recompute existing results.
+        overwrite_outputs (bool): Whether to regenerate existing outputs.
+        max_instances (int): Maximum number of instances to evaluate.
+        verbosity (int): Verbosity level.
+        n_workers (int): Number of scoring threads.
+        max_queue_size (int): Maximum number of outputs waiting to be scored.
+
+    Returns:
+        (dict): Average weighted accuracy, number of instances, and all results and outputs, by instance.
+    """
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(n_workers)
+    slots = asyncio.Semaphore(max_queue_size)
+
+    def release(_):
+        slots.release()
+
+    pending_results = []
+    all_instance_outputs = []
+    try:
+        for n_instances, instance in enumerate(dataset):
+            if n_instances >= max_instances:
+                break
+            instance_id = instance.instance_id
+            futures, outputs = [], []
+            for i in range(n_replicates):
+                output, result = None, None
+                output_path, results_path = None, None
+                if output_dir is not None:
+                    output_path = os.path.join(
+                        output_dir, f"{instance_id}-{i}-output.json"
+                    )
+                    results_path = os.path.join(
+                        output_dir, f"{instance_id}-{i}-results.json"
+                    )
+                    if not overwrite_outputs and os.path.exists(output_path):
+                        with open(output_path) as f:
+                            output = ModelOutput.model_validate_json(f.read())
+                    if (
+                        output is not None
+                        and not overwrite_results
+                        and os.path.exists(results_path)
+                    ):
+                        with open(results_path) as f:
+                            result = json.load(f)
+
+                if output is None:
+                    output = await model(instance, output_dir, replicate=i)
+                    if output_path is not None:
+                        with open(output_path, "w") as f:
+                            f.write(output.model_dump_json(indent=4))
+
+                if result is None:
+                    await slots.acquire()
+                    future = loop.run_in_executor(
+                        pool, _score, evaluator, instance, output, results_path
+                    )
+                    future.add_done_callback(release)
+                else:
+                    future = loop.create_future()
+                    future.set_result(result)
+                futures.append(future)
+                outputs.append(output)
+
+            pending_results.append((instance_id, futures))
+            all_instance_outputs.append(outputs)
+
+        all_instance_results = []
+        for instance_id, futures in pending_results:
+            results = list(await asyncio.gather(*futures))
+            all_instance_results.append(results)
+            if verbosity > 0:
+                accuracies = [r["weighted_accuracy"] for r in results]
+                print(
+                    f"Instance {instance_id}: weighted accuracy {sum(accuracies) / len(accuracies):.4f}"
+                )
+    finally:
+        pool.shutdown(wait=True)
+
+    accuracies = [r["weighted_accuracy"] for rs in all_instance_results for r in rs]
+    return {
+        "average_weighted_accuracy": sum(accuracies) / len(accuracies)
+        if accuracies
+        else float("nan"),
+        "n_instances": len(all_instance_results),
+        "all_instance_results": all_instance_results,
+        "all_instance_outputs": all_instance_outputs,
+    }
@@ -0,0 +1,351 @@
+import re
+import asyncio
+import warnings
+import itertools
+import threading
+from collections import OrderedDict, deque
+from genlm.control import Potential
+
+_TOKENS = re.compile(r"\(|\)|[^\s()]+")
+_ATOM = re.compile(r"\(([^\s()]+)((?:\s+[^\s()]+)*)\s*\)")
+
+
+def parse_pddl(text):
+    """Parse PDDL text into nested lists of lowercase strings."""
+    text = re.sub(r";[^\n]*", "", text).lower()
+    stack = [[]]
+    for token in _TOKENS.findall(text):
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            if len(stack) == 1:
+                raise ValueError("Unbalanced parentheses in PDDL.")
+            expr = stack.pop()
+            stack[-1].append(expr)
+        else:
+            stack[-1].append(token)
+    if len(stack) != 1 or not stack[0]:
+        raise ValueError("Unbalanced parentheses in PDDL.")
+    return stack[0][0]
+
+
+def _section(expr, key):
+    for item in expr:
+        if isinstance(item, list) and item and item[0] == key:
+            return item[1:]
+    return None
+
+
+def _typed_list(items):
+    """`[(name, type), ...]` from a PDDL typed list such as `?x ?y - block ?z`."""
+    typed, pending, i = [], [], 0
+    while i < len(items):
+        if items[i] == "-":
+            typed.extend((name, items[i + 1]) for name in pending)
+            pending, i = [], i + 2
+        else:
+            pending.append(items[i])
+            i += 1
+    typed.extend((name, "object") for name in pending)
+    return typed
+
+
+def _literals(expr):
+    """Positive and negative atoms of a conjunction of literals."""
+    if not expr:
+        return [], []
+    if expr[0] == "and":
+        pos, neg = [], []
+        for sub in expr[1:]:
+            p, n = _literals(sub)
+            pos.extend(p)
+            neg.extend(n)
+        return pos, neg
+    if expr[0] == "not":
+        pos, neg = _literals(expr[1])
+        if neg:
+            raise ValueError("Nested negation is not supported.")
+        return [], pos
+    if any(isinstance(x, list) for x in expr):
+        raise ValueError(f"Unsupported PDDL expression: {expr[0]}")
+    return [tuple(expr)], []
+
+
+def parse_goal_atoms(text, complete):
+    """Atoms of a generated goal such as ` (on b1 b2) (clear b1) (on-table b2`.
+
+    The last predicate of a goal is not closed. While the goal is a prefix (`complete`
+    is False) it is ignored, since it may still be extended; when the goal is complete it
+    is closed and included.
+    """
+    if complete and text.rfind("(") > text.rfind(")"):
+        text = text + ")"
+    return [
+        (m.group(1).lower(), *m.group(2).lower().split()) for m in _ATOM.finditer(text)
+    ]
+
+
+class BlocksworldGoalChecker:
+    """Decides whether a conjunction of blocksworld atoms holds in some reachable state.
+
+    In the 4-operator blocksworld domain, every state in which each block is on the
+    table, on exactly one other block, or held, with no cycles, at most one block held,
+    `arm-empty` exactly when no block is held, and `clear` exactly for blocks with
+    nothing on them that are not held, is reachable from every other. A goal is therefore
+    reachable exactly when its atoms are consistent with one such state, which is checked
+    with bitmasks over the problem's objects.
+
+    Args:
+        objects (list[str]): Objects of the problem.
+    """
+
+    PREDICATES = {"clear": 1, "on-table": 1, "arm-empty": 0, "holding": 1, "on": 2}
+
+    def __init__(self, objects):
+        self.objects = list(objects)
+        self.bits = {obj: 1 << i for i, obj in enumerate(self.objects)}
+
+    @classmethod
+    def supports(cls, domain):
+        """Whether `domain` (parsed PDDL) is the blocksworld domain this checker is specialised to."""
+        name = _section(domain, "domain")
+        predicates = _section(domain, ":predicates") or []
+        arities = {p[0]: len(_typed_list(p[1:])) for p in predicates}
+        return name == ["blocksworld"] and arities == cls.PREDICATES
+
+    def is_reachable(self, atoms):
+        bits = self.bits
+        supported = covered = clear = held = 0
+        arm_empty = False
+        below = {}
+        for atom in set(atoms):
+            pred, args = atom[0], atom[1:]
+            if self.PREDICATES.get(pred) != len(args):
+                return False
+            if any(arg not in bits for arg in args):
+                return False
+            if pred == "arm-empty":
+                arm_empty = True
+            elif pred == "clear":
+                clear |= bits[args[0]]
+            else:
+                x = bits[args[0]]
+                if supported & x:  # On two things, or held and on something.
+                    return False
+                supported |= x
+                if pred == "holding":
+                    held |= x
+                elif pred == "on":
+                    y = bits[args[1]]
+                    if x == y or covered & y:
+                        return False
+                    covered |= y
+                    below[args[0]] = args[1]
+        if covered & (clear | held) or clear & held:
+            return False
+        if held & (held - 1) or (arm_empty and held):
+            return False
+        for x in below:  # Towers of `on` atoms must be acyclic.
+            seen, y = {x}, below[x]
+            while y in below:
+                if y in seen:
+                    return False
+                seen.add(y)
+                y = below[y]
+        return True
+
+
+class StripsGoalChecker:
+    """Decides goal reachability in a STRIPS domain by enumerating the reachable states.
+
+    Actions are grounded over the problem's objects (respecting declared types, without
+    type hierarchies) and states are enumerated breadth-first from the initial state as
+    bitmasks over ground atoms. A goal is reachable if some reachable state contains all
+    of its atoms.
+
+    Args:
+        domain (list): Parsed domain PDDL.
+        problem (list): Parsed problem PDDL.
+        max_states (int): Maximum number of states to enumerate.
+        max_cache_size (int): Maximum number of cached goal verdicts.
+
+    Raises:
+        ValueError: If the domain uses features beyond STRIPS, or has more than `max_states` reachable states.
+    """
+
+    def __init__(self, domain, problem, max_states=50_000, max_cache_size=100_000):
+        objects = _typed_list(_section(problem, ":objects") or [])
+        objects += _typed_list(_section(domain, ":constants") or [])
+        self.max_cache_size = max_cache_size
+        self._atoms = {}
+        self._cache = OrderedDict()
+        # Calls may run concurrently in threads (see `ConcurrentPotential`).
+        self._lock = threading.Lock()
+
+        init = 0
+        for atom in _section(problem, ":init") or []:
+            init |= self._bit(tuple(atom))
+
+        actions = []
+        for item in domain:
+            if isinstance(item, list) and item and item[0] == ":action":
+                actions.extend(self._ground(item, objects))
+
+        states, frontier = {init}, deque([init])
+        while frontier:
+            state = frontier.popleft()
+            for pre, add, delete in actions:
+                if state & pre == pre:
+                    successor = (state & ~delete) | add
+                    if successor not in states:
+                        if len(states) >= max_states:
+                            raise ValueError(
+                                f"More than {max_states} reachable states."
+                            )
+                        states.add(successor)
+                        frontier.append(successor)
+        self.states = list(states)
+
+    def _bit(self, atom):
+        if atom not in self._atoms:
+            self._atoms[atom] = 1 << len(self._atoms)
+        return self._atoms[atom]
+
+    def _ground(self, action, objects):
+        fields = dict(zip(action[2::2], action[3::2]))
+        parameters = _typed_list(fields.get(":parameters", []))
+        pre_pos, pre_neg = _literals(fields.get(":precondition", []))
+        add, delete = _literals(fields.get(":effect", []))
+        if pre_neg:
+            raise ValueError("Negative preconditions are not supported.")
+        choices = [
+            [o for o, t in objects if ptype == "object" or t == ptype]
+            for _, ptype in parameters
+        ]
+        for values in itertools.product(*choices):
+            binding = dict(zip((p for p, _ in parameters), values))
+
+            def mask(atoms):
+                m = 0
+                for atom in atoms:
+                    m |= self._bit(tuple(binding.get(a, a) for a in atom))
+                return m
+
+            yield mask(pre_pos), mask(add), mask(delete)
+
+    def is_reachable(self, atoms):
+        goal = 0
+        for atom in atoms:
+            if atom not in self._atoms:
+                return False
+            goal |= self._atoms[atom]
+        with self._lock:
+            if goal in self._cache:
+                self._cache.move_to_end(goal)
+                return self._cache[goal]
+        reachable = any(state & goal == goal for state in self.states)
+        with self._lock:
+            self._cache[goal] = reachable
+            if len(self._cache) > self.max_cache_size:
+                self._cache.popitem(last=False)
+        return reachable
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def make_goal_checker(domain_text, problem_text, max_states=50_000):
+    """The blocksworld checker for the blocksworld domain, else a `StripsGoalChecker`.
+
+    Returns None if the domain is not supported by either, so that callers can fall back
+    to an external planner and validator.
+    """
+    try:
+        domain, problem = parse_pddl(domain_text), parse_pddl(problem_text)
+        if BlocksworldGoalChecker.supports(domain):
+            objects = _typed_list(_section(problem, ":objects") or [])
+            return BlocksworldGoalChecker([name for name, _ in objects])
+        return StripsGoalChecker(domain, problem, max_states=max_states)
+    except (ValueError, IndexError):
+        return None
+
+
+class GoalCheckerPotential(Potential):
+    """Checks in-process that a (partial) generated goal is reachable from the initial state.
+
+    While the goal is a prefix, its unfinished last predicate is ignored; at completion,
+    every predicate must be part of the reachable conjunction.
+
+    Args:
+        checker (BlocksworldGoalChecker | StripsGoalChecker): Checker for the problem.
+    """
+
+    def __init__(self, checker):
+        super().__init__(vocabulary=list(range(256)))
+        self.checker = checker
+
+    async def prefix(self, context):
+        return self._check(context, complete=False)
+
+    async def complete(self, context):
+        return self._check(context, complete=True)
+
+    def _check(self, context, complete):
+        text = bytes(context).decode(errors="ignore")
+        atoms = parse_goal_atoms(text, complete)
+        return 0.0 if self.checker.is_reachable(atoms) else float("-inf")
+
+
+class CrossCheckedPotential(Potential):
+    """Evaluates two potentials that should agree, returning the reference's value.
+
+    Disagreements on whether a context has zero weight are counted and reported with a
+    warning.
+
+    Args:
+        potential (Potential): Potential being checked.
+        reference (Potential): Trusted potential over the same vocabulary.
+    """
+
+    def __init__(self, potential, reference):
+        super().__init__(
+            vocabulary=reference.vocab,
+            token_type=reference.token_type,
+            eos=reference.eos,
+        )
+        self.potential = potential
+        self.reference = reference
+        self.n_checked = 0
+        self.n_disagreements = 0
+
+    async def prefix(self, context):
+        return await self._run("prefix", context)
+
+    async def complete(self, context):
+        return await self._run("complete", context)
+
+    async def _run(self, method, context):
+        logw, reference_logw = await asyncio.gather(
+            getattr(self.potential, method)(context),
+            getattr(self.reference, method)(context),
+        )
+        self.n_checked += 1
+        if (logw == float("-inf")) != (reference_logw == float("-inf")):
+            self.n_disagreements += 1
+            warnings.warn(
+                f"{type(self.potential).__name__}.{method} disagrees with "
+                f"{type(self.reference).__name__} on {bytes(context)!r}: "
+                f"{logw} vs {reference_logw}"
+            )
+        return reference_logw
+
+    def close(self):
+        for potential in (self.potential, self.reference):
+            if hasattr(potential, "close"):
+                potential.close()
@@ -1,4 +1,5 @@
 import click
+import warnings
 from pathlib import Path
 from genlm.control import BoolCFG
 
@@ -16,6 +17,12 @@ from experiments.common import (
     setup_model_and_params,
 )
 from experiments.util import make_prompt_formatter
+from experiments.datasets import load_dataset
+from experiments.goal_inference.checker import (
+    CrossCheckedPotential,
+    GoalCheckerPotential,
+    make_goal_checker,
+)
 
 
 class GoalInferencePotentialFactory(PotentialFactory):
@@ -23,8 +30,13 @@ class GoalInferencePotentialFactory(PotentialFactory):
     Produces the fast (grammar/static) and expensive (plan validation) potentials.
     If the instance provides a lark_grammar, that is preferred; otherwise use grammar_text.
     If no plan is available or expensive checks are disabled, returns a NeutralPotential.
+    With `goal_checker="native"`, goals are checked in-process by a `GoalCheckerPotential`
+    (falling back to VAL for domains it cannot handle); with "both", the native checker is
+    cross-checked against VAL.
     """
 
+    critic_boundary_bytes = b")"
+
     def __init__(
         self,
         domain_path: str,
@@ -34,6 +46,7 @@ class GoalInferencePotentialFactory(PotentialFactory):
         cache_root: str | Path = "./cache",
         verbosity: int = 0,
         timeout_seconds: float = 180.0,
+        goal_checker: str = "val",
     ):
         self.goal_grammar_text = goal_grammar_text
         self.val_cmd = val_cmd
@@ -41,6 +54,7 @@ class GoalInferencePotentialFactory(PotentialFactory):
         self.cache_root = cache_root
         self.verbosity = verbosity
         self.timeout_seconds = timeout_seconds
+        self.goal_checker = goal_checker
 
         with open(domain_path) as f:
             self.domain_text = f.read()
@@ -49,6 +63,20 @@ class GoalInferencePotentialFactory(PotentialFactory):
         return BoolCFG.from_lark(self.goal_grammar_text)
 
     def get_expensive_potential(self, instance):
+        if self.goal_checker == "val":
+            return self._val_potential(instance)
+        checker = make_goal_checker(self.domain_text, instance.problem_text)
+        if checker is None:
+            warnings.warn(
+                "The native goal checker does not support this problem; using VAL."
+            )
+            return self._val_potential(instance)
+        potential = GoalCheckerPotential(checker)
+        if self.goal_checker == "both":
+            return CrossCheckedPotential(potential, self._val_potential(instance))
+        return potential
+
+    def _val_potential(self, instance):
         return GoalInferenceVALPotential(
             domain_pddl_text=self.domain_text,
             problem_pddl_text=instance.problem_text,
@@ -77,6 +105,12 @@ class GoalInferencePotentialFactory(PotentialFactory):
     default=150,
     help="Maximum number of tokens to generate.",
 )
+@click.option(
+    "--goal-checker",
+    default="val",
+    type=click.Choice(["val", "native", "both"]),
+    help="How the critic checks goals: with Fast Downward and VAL subprocesses, with the in-process checker, or with both (cross-checked, returning VAL's verdict).",
+)
 @click.option(
     "--max-objects",
     default=9,
@@ -88,7 +122,9 @@ def main(**kwargs):
     grammar_path = kwargs.pop("grammar_path", None)
     verbosity = int(kwargs.pop("verbosity", 0))
     max_objects = kwargs.pop("max_objects")
-    
+    dataset_cache_dir = kwargs.pop("dataset_cache_dir")
+    goal_checker = kwargs.pop("goal_checker")
+
     domains_opt = ["blocksworld"]
 
     # Load optional grammar text
@@ -99,7 +135,9 @@ def main(**kwargs):
     # Setup model
     model_class, kwargs = setup_model_and_params(model_type, kwargs)
 
-    dataset = GoalInferenceDataset.from_hf_planetarium(
+    dataset = load_dataset(
+        GoalInferenceDataset.from_hf_planetarium,
+        cache_dir=dataset_cache_dir,
         max_objects=max_objects,
         domains=domains_opt,
     )
@@ -113,6 +151,7 @@ def main(**kwargs):
         domain_path=domain_path,
         goal_grammar_text=grammar_text,
         fast_downward_cmd="./fast-downward.sif",
+        goal_checker=goal_checker,
     )
 
     def cache_key_fn(instance):
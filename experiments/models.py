@@ -1,10 +1,16 @@
 import os
 import time
+from contextlib import nullcontext
 from functools import cached_property
 from abc import ABC, abstractmethod
 from genlm.eval import ModelOutput, ModelResponse
 from genlm.control import direct_token_sampler, eager_token_sampler, PromptedLLM
-from .util import improperly_weighted_eager_token_sampler
+from .util import (
+    improperly_weighted_eager_token_sampler,
+    fast_forward_token_sampler,
+    FastForwardTokenSampler,
+)
+from .potentials import ConcurrentPotential, ScheduledCritic, parse_critic_schedule
 from collections import OrderedDict
 
 
@@ -26,6 +32,11 @@ class Model(ABC):
         cache_key_fn: Function to generate cache key for instances. Takes an instance and returns a cache key. If None, caching is disabled.
         max_cache_size: Maximum number of cached samplers
         eos_token_factory: Function to generate EOS tokens for the language model. Takes a language model and returns a list of EOS tokens. If None, the language model's EOS tokens are used.
+        critic_concurrency (int): Maximum number of critic calls evaluated concurrently in a worker pool. If 0, critic calls run on the event loop.
+        critic_executor (str): Worker pool for concurrent critic calls, "thread" or "process".
+        memory_profiler (experiments.profiling.MemoryProfiler): If given, records the memory use of each call.
+        fast_forward (bool): Whether models with a fast potential append grammar-forced tokens without sampling them.
+        critic_schedule (str): When the critic's prefix is evaluated: "token" (every token), "boundary" (after tokens containing one of the potential factory's `critic_boundary_bytes`), "every-K", or a comma-separated combination.
     """
 
     def __init__(
@@ -41,6 +52,11 @@ class Model(ABC):
         max_cache_size: int = 1,
         lm_args=None,
         eos_token_factory=None,
+        critic_concurrency: int = 0,
+        critic_executor: str = "thread",
+        memory_profiler=None,
+        fast_forward: bool = False,
+        critic_schedule: str = "token",
     ):
         self.lm_name = lm_name
         self.lm_args = lm_args or {}
@@ -54,6 +70,17 @@ class Model(ABC):
         self.max_cache_size = max_cache_size
         self._sampler_cache = OrderedDict()
         self.eos_token_factory = eos_token_factory
+        self.critic_concurrency = critic_concurrency
+        self.critic_executor = critic_executor
+        self.memory_profiler = memory_profiler
+        self.fast_forward = fast_forward
+        self.critic_schedule = critic_schedule
+        # Fail before the LM is loaded rather than at the first instance.
+        boundary, _ = parse_critic_schedule(critic_schedule)
+        if boundary and not potential_factory.critic_boundary_bytes:
+            raise ValueError(
+                f"The 'boundary' critic schedule is not supported by {type(potential_factory).__name__}, which defines no critic boundary bytes."
+            )
 
     @cached_property
     def llm(self):
@@ -129,7 +156,7 @@ class Model(ABC):
         """
         self.llm.prompt_ids = self.prompt_formatter(self.llm.model.tokenizer, instance)
         sampler = self.make_sampler(instance)
-        critic = self.make_critic(instance)
+        potential = critic = self.make_critic(instance)
         if critic is not None:
             critic_class_name = critic.__class__.__name__
             if "DS1000RuntimeNoError" in critic_class_name:
@@ -138,30 +165,66 @@ class Model(ABC):
                 ]
             else:
                 f = b"".join
+            if self.critic_concurrency > 0:
+                potential = critic = ConcurrentPotential(
+                    critic,
+                    max_concurrency=self.critic_concurrency,
+                    executor=self.critic_executor,
+                )
             critic = critic.coerce(self.llm, f=f)
+            if self.critic_schedule != "token":
+                critic = ScheduledCritic.from_schedule(
+                    critic,
+                    self.critic_schedule,
+                    boundary_bytes=self.potential_factory.critic_boundary_bytes,
+                )
 
         json_path = os.path.join(
             output_dir, f"{instance.instance_id}-{replicate}-record.json"
         )
 
-        time_start = time.time()
-        sequences = await sampler.smc(
-            n_particles=self.n_particles,
-            ess_threshold=self.ess_threshold,
-            max_tokens=self.max_tokens,
-            resampling_method=self.resampling_method,
-            critic=critic,
-            json_path=json_path,
-        )
-        time_end = time.time()
+        if self.memory_profiler is not None:
+            profile = self.memory_profiler.measure(instance.instance_id, replicate)
+        else:
+            profile = nullcontext()
 
-        return ModelOutput(
-            responses=[
+        if isinstance(sampler, FastForwardTokenSampler):
+            n_forced_start = sampler.n_forced
+
+        time_start = time.time()
+        with profile:
+            try:
+                sequences = await sampler.smc(
+                    n_particles=self.n_particles,
+                    ess_threshold=self.ess_threshold,
+                    max_tokens=self.max_tokens,
+                    resampling_method=self.resampling_method,
+                    critic=critic,
+                    json_path=json_path,
+                )
+            finally:
+                # Release per-instance critic resources (e.g. interpreter snapshots).
+                if hasattr(potential, "close"):
+                    potential.close()
+            time_end = time.time()
+            # Decoded inside the measured block, since decoding allocates too.
+            responses = [
                 ModelResponse(response=sequence, weight=prob)
                 for sequence, prob in sequences.decoded_posterior.items()
-            ],
-            runtime_seconds=time_end - time_start,
-        )
+            ]
+
+        if isinstance(potential, ConcurrentPotential):
+            print(f"Critic ({instance.instance_id}-{replicate}): {potential.stats}")
+        if isinstance(critic, ScheduledCritic):
+            print(
+                f"Critic schedule ({instance.instance_id}-{replicate}): {critic.n_evaluated} evaluated, {critic.n_reused} reused"
+            )
+        if isinstance(sampler, FastForwardTokenSampler):
+            print(
+                f"Fast-forwarded tokens ({instance.instance_id}-{replicate}): {sampler.n_forced - n_forced_start}"
+            )
+
+        return ModelOutput(responses=responses, runtime_seconds=time_end - time_start)
 
 
 class PotentialFactory(ABC):
@@ -169,8 +232,14 @@ class PotentialFactory(ABC):
 
     Defines interface for creating both fast (token-level) and expensive (sequence-level)
     potential functions used in controlled text generation.
+
+    Attributes:
+        critic_boundary_bytes (bytes, optional): Bytes after which the expensive potential's verdict
+            can change, used by the "boundary" critic schedule.
     """
 
+    critic_boundary_bytes = None
+
     @abstractmethod
     def get_fast_potential(self, instance):
         """Creates a fast potential function.
@@ -212,9 +281,11 @@ class FastBase(Model, ABC):
         pass
 
     def _make_sampler(self, instance):
-        return self.sampler_cls(
-            self.llm, self.potential_factory.get_fast_potential(instance)
-        )
+        bool_cfg = self.potential_factory.get_fast_potential(instance)
+        sampler = self.sampler_cls(self.llm, bool_cfg)
+        if self.fast_forward:
+            sampler = fast_forward_token_sampler(sampler, self.llm, bool_cfg)
+        return sampler
 
 
 class FastProperlyWeighted(FastBase):
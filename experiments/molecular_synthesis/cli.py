@@ -14,6 +14,10 @@ from experiments.common import (
     setup_model_and_params,
 )
 from experiments.util import make_prompt_formatter
+from experiments.datasets import load_dataset
+from experiments.molecular_synthesis.evaluation import (
+    CachedMolecularSynthesisEvaluator,
+)
 
 
 class MolecularSynthesisPotentialFactory(PotentialFactory):
@@ -33,6 +37,17 @@ class MolecularSynthesisPotentialFactory(PotentialFactory):
     "--smiles-file",
     help="Path to the SMILES file.",
 )
+@click.option(
+    "--score-cache-path",
+    default=None,
+    help="SQLite file caching molecule scores across runs, keyed by canonical SMILES. If set, each distinct molecule is scored once, in batches on a process pool.",
+)
+@click.option(
+    "--score-workers",
+    default=4,
+    type=int,
+    help="Number of processes scoring uncached molecules (with --score-cache-path).",
+)
 @common_options
 @click.option(
     "--lm-name",
@@ -52,10 +67,22 @@ class MolecularSynthesisPotentialFactory(PotentialFactory):
 def main(**kwargs):
     model_type = kwargs.pop("model_type")
     data_dir = kwargs.pop("smiles_file")
+    score_cache_path = kwargs.pop("score_cache_path")
+    score_workers = kwargs.pop("score_workers")
 
     model_class, kwargs = setup_model_and_params(model_type, kwargs)
-    dataset = MolecularSynthesisDataset.from_smiles(data_dir)
-    evaluator = MolecularSynthesisEvaluator()
+    dataset = load_dataset(
+        MolecularSynthesisDataset.from_smiles,
+        data_dir,
+        cache_dir=kwargs.pop("dataset_cache_dir"),
+        source_paths=[data_dir],
+    )
+    if score_cache_path is not None:
+        evaluator = CachedMolecularSynthesisEvaluator(
+            cache_path=score_cache_path, n_workers=score_workers
+        )
+    else:
+        evaluator = MolecularSynthesisEvaluator()
 
     potential_factory = MolecularSynthesisPotentialFactory(kwargs.pop("grammar_path"))
 
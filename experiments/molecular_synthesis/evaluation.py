@@ -0,0 +1,107 @@
+import threading
+from functools import lru_cache
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from rdkit import Chem, RDLogger
+from genlm.eval.domains.molecular_synthesis import MolecularSynthesisEvaluator
+
+from experiments.cache import PersistentCache
+
+_worker_evaluator = None
+
+
+@contextmanager
+def _rdkit_logs_disabled():
+    """Silence RDKit's parse errors, which are expected for generated strings."""
+    RDLogger.DisableLog("rdApp.*")
+    try:
+        yield
+    finally:
+        RDLogger.EnableLog("rdApp.*")
+
+
+def _init_worker():
+    global _worker_evaluator
+    # Scoring processes only score, so their RDKit logs stay disabled.
+    RDLogger.DisableLog("rdApp.*")
+    _worker_evaluator = MolecularSynthesisEvaluator()
+
+
+def _score_batch(instance, smiles):
+    """Score each string in `smiles` with a `MolecularSynthesisEvaluator`, in a worker process."""
+    return [_worker_evaluator.evaluate_sample(instance, s) for s in smiles]
+
+
+@lru_cache(maxsize=100_000)
+def canonical_smiles(smiles):
+    """RDKit canonical SMILES of `smiles`, or None if it does not parse."""
+    with _rdkit_logs_disabled():
+        mol = Chem.MolFromSmiles(smiles.strip())
+        return None if mol is None else Chem.MolToSmiles(mol)
+
+
+class CachedMolecularSynthesisEvaluator(MolecularSynthesisEvaluator):
+    """`MolecularSynthesisEvaluator` scoring each distinct molecule once.
+
+    Responses are canonicalized with RDKit and the canonical SMILES is scored in place
+    of the response, so that every spelling of a molecule gets the same result. Results
+    of `evaluate_sample` are cached by canonical SMILES in a `PersistentCache` (responses
+    that do not parse are scored and cached as they are). Before an ensemble is
+    evaluated, molecules missing from the cache are scored in batches on a process pool.
+    Results are assumed to depend on the molecule only, not on the instance.
+
+    Args:
+        cache_path (str, optional): SQLite file persisting results across runs. If None, results are cached in memory only.
+        n_workers (int): Number of scoring processes. If 0, molecules are scored in this process.
+        batch_size (int): Number of molecules scored per task.
+    """
+
+    def __init__(self, cache_path=None, n_workers=4, batch_size=64):
+        super().__init__()
+        self.scores = PersistentCache(cache_path)
+        self.n_workers = n_workers
+        self.batch_size = batch_size
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(response):
+        canonical = canonical_smiles(response)
+        return ("raw", response) if canonical is None else ("canonical", canonical)
+
+    def evaluate_sample(self, instance, response):
+        key = self._key(response)
+        result = self.scores.get(key)
+        if result is None:
+            result = super().evaluate_sample(instance, key[1])
+            self.scores.set(key, result)
+        return result
+
+    def _score_batches(self, instance, smiles):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    self.n_workers, initializer=_init_worker
+                )
+        batches = [
+            smiles[i : i + self.batch_size]
+            for i in range(0, len(smiles), self.batch_size)
+        ]
+        futures = [self._pool.submit(_score_batch, instance, b) for b in batches]
+        return [result for future in futures for result in future.result()]
+
+    def evaluate_ensemble(self, instance, output):
+        if self.n_workers > 0:
+            keys = {self._key(response.response) for response in output.responses}
+            missing = list(keys - self.scores.get_many(keys).keys())
+            if missing:
+                scored = self._score_batches(instance, [key[1] for key in missing])
+                self.scores.set_many(dict(zip(missing, scored)))
+        return super().evaluate_ensemble(instance, output)
+
+    def close(self):
+        """Shut down the scoring processes and close the cache."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self.scores.close()
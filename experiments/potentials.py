@@ -0,0 +1,275 @@
+import time
+import asyncio
+from dataclasses import dataclass
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from genlm.control import Potential
+
+
+@dataclass
+class ConcurrencyStats:
+    """Call statistics of a `ConcurrentPotential`.
+
+    Attributes:
+        n_calls (int): Number of completed calls.
+        max_in_flight (int): Largest number of calls running at once.
+        busy_seconds (float): Sum of the durations of all calls.
+        active_seconds (float): Wall time during which at least one call was running.
+    """
+
+    n_calls: int = 0
+    max_in_flight: int = 0
+    busy_seconds: float = 0.0
+    active_seconds: float = 0.0
+    _in_flight: int = 0
+    _active_since: float = 0.0
+
+    @property
+    def parallelism(self):
+        """Average number of calls running while any call was running."""
+        if self.active_seconds == 0:
+            return 0.0
+        return self.busy_seconds / self.active_seconds
+
+    def start(self):
+        now = time.perf_counter()
+        if self._in_flight == 0:
+            self._active_since = now
+        self._in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        return now
+
+    def stop(self, started):
+        now = time.perf_counter()
+        self._in_flight -= 1
+        if self._in_flight == 0:
+            self.active_seconds += now - self._active_since
+        self.n_calls += 1
+        self.busy_seconds += now - started
+
+    def __str__(self):
+        return (
+            f"{self.n_calls} calls, max {self.max_in_flight} in flight, "
+            f"achieved parallelism {self.parallelism:.2f}"
+        )
+
+
+_worker_potential = None
+
+
+def _init_worker(potential):
+    global _worker_potential
+    _worker_potential = potential
+
+
+def _call_in_worker(method, context):
+    return asyncio.run(getattr(_worker_potential, method)(context))
+
+
+def _call(potential, method, context):
+    return asyncio.run(getattr(potential, method)(context))
+
+
+class ConcurrentPotential(Potential):
+    """Runs a potential's `prefix` and `complete` calls in a worker pool, with bounded concurrency.
+
+    Expensive potentials often block on subprocesses or I/O, which stalls the event loop
+    and serializes the calls made for different particles. Wrapping such a potential runs
+    each call to completion in a thread (or process) of its own, so that the calls made for
+    all particles at a step overlap, with at most `max_concurrency` running at once.
+
+    Each call runs under a fresh event loop (`asyncio.run`) in its worker. The wrapped
+    potential must therefore not hold state bound to an event loop (e.g. asyncio locks,
+    queues or clients created on the main loop), and with the "thread" executor it must be
+    thread-safe, since calls for different particles run at the same time.
+
+    Args:
+        potential (Potential): The potential to wrap.
+        max_concurrency (int): Maximum number of calls running at once.
+        executor (str): "thread" or "process". With "process", `potential` must be picklable;
+            it is sent to each worker once.
+    """
+
+    def __init__(self, potential, max_concurrency=8, executor="thread"):
+        if executor not in ("thread", "process"):
+            raise ValueError(
+                f"Unknown executor '{executor}'. Must be 'thread' or 'process'."
+            )
+        super().__init__(
+            vocabulary=potential.vocab,
+            token_type=potential.token_type,
+            eos=potential.eos,
+        )
+        self.potential = potential
+        self.max_concurrency = max_concurrency
+        self.executor = executor
+        self.stats = ConcurrencyStats()
+        self._pool = None
+        self._semaphore = None
+
+    async def prefix(self, context):
+        return await self._run("prefix", context)
+
+    async def complete(self, context):
+        return await self._run("complete", context)
+
+    async def _run(self, method, context):
+        if self._pool is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            if self.executor == "thread":
+                self._pool = ThreadPoolExecutor(self.max_concurrency)
+            else:
+                self._pool = ProcessPoolExecutor(
+                    self.max_concurrency,
+                    initializer=_init_worker,
+                    initargs=(self.potential,),
+                )
+
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            started = self.stats.start()
+            try:
+                if self.executor == "thread":
+                    return await loop.run_in_executor(
+                        self._pool, _call, self.potential, method, context
+                    )
+                return await loop.run_in_executor(
+                    self._pool, _call_in_worker, method, context
+                )
+            finally:
+                self.stats.stop(started)
+
+    def close(self):
+        """Shut down the worker pool and close the wrapped potential."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if hasattr(self.potential, "close"):
+            self.potential.close()
+
+
+def parse_critic_schedule(schedule):
+    """Parse a critic schedule string.
+
+    Args:
+        schedule (str): "token", or a comma-separated combination of "boundary" and "every-K".
+
+    Returns:
+        (tuple): Whether the schedule includes "boundary", and `K` (None if absent, or for "token").
+
+    Raises:
+        ValueError: If the schedule is invalid.
+    """
+    boundary, every = False, None
+    if schedule.strip() == "token":
+        return boundary, every
+    for part in schedule.split(","):
+        part = part.strip()
+        if part == "boundary":
+            boundary = True
+        elif part.startswith("every-") and part[len("every-") :].isdigit():
+            every = int(part[len("every-") :])
+            if every < 1:
+                raise ValueError(f"Invalid critic schedule '{schedule}'.")
+        else:
+            raise ValueError(
+                f"Unknown critic schedule '{part}'. Must be 'token', 'boundary' or 'every-K'."
+            )
+    return boundary, every
+
+
+class ScheduledCritic(Potential):
+    """Evaluates a critic's `prefix` only at scheduled positions, reusing its last value in between.
+
+    The wrapped critic's `prefix` is called on a context only when its last token is a
+    boundary (as decided by `is_boundary`) or its length is a multiple of `every`. For any
+    other context, the value of the critic on the longest scheduled prefix of the context
+    is returned (0 for the empty prefix). `complete` is always evaluated.
+
+    Since SMC untwists the previous critic value at each step and always applies
+    `complete` at the end, the final weights are those of the unscheduled critic; the
+    schedule only changes the intermediate targets that resampling acts on.
+
+    Args:
+        potential (Potential): The critic to wrap.
+        is_boundary (Callable, optional): Predicate on tokens marking boundaries.
+        every (int, optional): Also evaluate the critic every `every` tokens.
+        max_cache_size (int): Maximum number of cached prefix values.
+    """
+
+    def __init__(self, potential, is_boundary=None, every=None, max_cache_size=10_000):
+        if is_boundary is None and every is None:
+            raise ValueError("At least one of `is_boundary` and `every` must be given.")
+        super().__init__(
+            vocabulary=potential.vocab,
+            token_type=potential.token_type,
+            eos=potential.eos,
+        )
+        self.potential = potential
+        self.is_boundary = is_boundary
+        self.every = every
+        self.max_cache_size = max_cache_size
+        self.n_evaluated = 0
+        self.n_reused = 0
+        self._cache = OrderedDict()
+
+    @classmethod
+    def from_schedule(cls, potential, schedule, boundary_bytes=None, **kwargs):
+        """Wrap `potential` according to a schedule string.
+
+        Args:
+            potential (Potential): The critic to wrap.
+            schedule (str): Comma-separated combination of "boundary" and "every-K".
+            boundary_bytes (bytes, optional): Bytes marking boundaries, for "boundary".
+            **kwargs: Passed to the constructor.
+
+        Returns:
+            (ScheduledCritic): The scheduled critic.
+        """
+        boundary, every = parse_critic_schedule(schedule)
+        is_boundary = None
+        if boundary:
+            if not boundary_bytes:
+                raise ValueError(
+                    "The 'boundary' critic schedule requires boundary bytes."
+                )
+            is_boundary = token_contains(boundary_bytes)
+        return cls(potential, is_boundary=is_boundary, every=every, **kwargs)
+
+    def _scheduled_length(self, context):
+        """Length of the longest prefix of `context` at which the critic is evaluated."""
+        n = len(context)
+        while n > 0:
+            if self.every is not None and n % self.every == 0:
+                return n
+            if self.is_boundary is not None and self.is_boundary(context[n - 1]):
+                return n
+            n -= 1
+        return 0
+
+    async def prefix(self, context):
+        n = self._scheduled_length(context)
+        if n == 0:
+            self.n_reused += 1
+            return 0.0
+        key = tuple(context[:n])
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.n_reused += 1
+            return self._cache[key]
+        self.n_evaluated += 1
+        logw = await self.potential.prefix(context[:n])
+        self._cache[key] = logw
+        if len(self._cache) > self.max_cache_size:
+            self._cache.popitem(last=False)
+        return logw
+
+    async def complete(self, context):
+        self.n_evaluated += 1
+        return await self.potential.complete(context)
+
+
+def token_contains(boundary_bytes):
+    """Predicate on byte tokens that holds for tokens containing any of `boundary_bytes`."""
+    boundary_bytes = frozenset(boundary_bytes)
+    return lambda token: not boundary_bytes.isdisjoint(token)
@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import time
+import resource
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+_MB = 1024 * 1024
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss(pid="self"):
+    """Resident set size of process `pid` in bytes, or 0 if it cannot be read."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _children(pid):
+    children = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return children
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(c) for c in f.read().split())
+        except (OSError, ValueError):
+            pass
+    return children
+
+
+def _descendants_rss(pid):
+    """Total resident set size of all descendants of `pid` in bytes."""
+    total, stack = 0, _children(pid)
+    while stack:
+        child = stack.pop()
+        total += _rss(child)
+        stack.extend(_children(child))
+    return total
+
+
+class MemoryProfiler:
+    """Opt-in per-instance memory instrumentation.
+
+    For each measured model call, records the process RSS before and after, the peak
+    RSS of the process and the peak total RSS of its child processes (e.g. critic
+    subprocesses and sandboxes) during the call, and the change in the number of
+    Python heap blocks and in traced Python heap memory. Peaks are sampled by a
+    background thread every `sample_interval` seconds and read from `/proc`, so they
+    are only available on Linux.
+
+    `tracemalloc` is enabled for as long as the profiler is used, which slows down
+    allocation-heavy code. With `snapshot_every > 0`, the top allocation sites are
+    also written every `snapshot_every` measured calls.
+
+    Records are appended to `memory.jsonl` in `output_dir` (or printed if `output_dir` is None),
+    next to the instance outputs and results.
+
+    Args:
+        output_dir (str, optional): Directory to write records and snapshots to.
+        snapshot_every (int): Number of measured calls between tracemalloc snapshots. If 0, no snapshots are taken.
+        top_n (int): Number of allocation sites in each snapshot.
+        sample_interval (float): Seconds between RSS samples.
+    """
+
+    def __init__(
+        self, output_dir=None, snapshot_every=0, top_n=25, sample_interval=0.05
+    ):
+        self.output_dir = output_dir
+        self.snapshot_every = snapshot_every
+        self.top_n = top_n
+        self.sample_interval = sample_interval
+        self.n_measured = 0
+        self.peak_rss = 0
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def measure(self, instance_id, replicate):
+        """Measure the memory use of the enclosed block, recording it under `instance_id` and `replicate`."""
+        pid = os.getpid()
+        peaks = {"rss": _rss(), "children_rss": _descendants_rss(pid)}
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(self.sample_interval):
+                peaks["rss"] = max(peaks["rss"], _rss())
+                peaks["children_rss"] = max(
+                    peaks["children_rss"], _descendants_rss(pid)
+                )
+
+        rss_start = peaks["rss"]
+        blocks_start = sys.getallocatedblocks()
+        heap_start = (
+            tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        )
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        time_start = time.time()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            rss_end = _rss()
+            record = {
+                "instance_id": instance_id,
+                "replicate": replicate,
+                "seconds": time.time() - time_start,
+                "rss_start_mb": rss_start / _MB,
+                "rss_end_mb": rss_end / _MB,
+                "peak_rss_mb": max(peaks["rss"], rss_end) / _MB,
+                "peak_children_rss_mb": peaks["children_rss"] / _MB,
+                # Largest RSS of any terminated child over the process lifetime (KiB on Linux).
+                "max_terminated_child_rss_mb": resource.getrusage(
+                    resource.RUSAGE_CHILDREN
+                ).ru_maxrss
+                / 1024,
+                "allocated_blocks_delta": sys.getallocatedblocks() - blocks_start,
+                "python_heap_delta_mb": (
+                    (tracemalloc.get_traced_memory()[0] - heap_start) / _MB
+                    if heap_start is not None
+                    else None
+                ),
+            }
+            self.peak_rss = max(self.peak_rss, max(peaks["rss"], rss_end))
+            self.n_measured += 1
+            self._write(record)
+            if (
+                self.snapshot_every > 0
+                and tracemalloc.is_tracing()
+                and self.n_measured % self.snapshot_every == 0
+            ):
+                self._snapshot(instance_id, replicate)
+
+    def _write(self, record):
+        if self.output_dir is None:
+            print(f"Memory: {json.dumps(record)}")
+            return
+        with open(os.path.join(self.output_dir, "memory.jsonl"), "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _snapshot(self, instance_id, replicate):
+        stats = tracemalloc.take_snapshot().statistics("lineno")[: self.top_n]
+        lines = [f"After {instance_id}-{replicate} ({self.n_measured} calls)"]
+        lines.extend(str(stat) for stat in stats)
+        text = "\n".join(lines) + "\n"
+        if self.output_dir is None:
+            print(text)
+            return
+        path = os.path.join(
+            self.output_dir, f"memory-snapshot-{self.n_measured:05d}.txt"
+        )
+        with open(path, "w") as f:
+            f.write(text)
@@ -0,0 +1,113 @@
+import os
+import asyncio
+import click
+from pathlib import Path
+from collections import Counter
+from genlm.eval.domains.ds1000 import DS1000Dataset, DS1000RuntimeNoErrorPotential
+
+from experiments.python_data_science.snapshots import (
+    DS1000RuntimeNoErrorSnapshotPotential,
+)
+
+# Appended to each reference solution to check that both critics reject a failing program.
+_FAILING_LINE = "__undefined_name_for_check__\n"
+
+
+def _contexts(solution):
+    """(method, program) pairs to check: every line prefix of `solution`, and the completions."""
+    ends = [i + 1 for i, c in enumerate(solution) if c == "\n"]
+    contexts = [("prefix", solution[:end]) for end in ends]
+    contexts.append(("complete", solution))
+    failing = solution if solution.endswith("\n") else solution + "\n"
+    contexts.append(("complete", failing + _FAILING_LINE))
+    return contexts
+
+
+async def compare(solution, potential, reference):
+    """Contexts of `solution` on which the two potentials disagree."""
+    disagreements = []
+    for method, program in _contexts(solution):
+        context = [program.encode()]
+        w, ref_w = await asyncio.gather(
+            getattr(potential, method)(context), getattr(reference, method)(context)
+        )
+        if (w == 0) != (ref_w == 0):
+            disagreements.append((method, program, w, ref_w))
+    return disagreements
+
+
+@click.command(
+    help="Check that DS1000RuntimeNoErrorSnapshotPotential agrees with DS1000RuntimeNoErrorPotential on the reference solutions and their line prefixes."
+)
+@click.option(
+    "--libraries",
+    default=None,
+    multiple=True,
+    help="Libraries to include in the environment, comma-separated (e.g. numpy,pandas).",
+)
+@click.option(
+    "--timeout-seconds",
+    default=15.0,
+    type=float,
+    help="Timeout of both critics.",
+)
+@click.option(
+    "--max-snapshots",
+    default=64,
+    type=int,
+    help="Maximum number of live interpreter snapshots.",
+)
+@click.option(
+    "--max-instances",
+    default=100000,
+    type=int,
+    help="Maximum number of instances to check.",
+)
+def main(libraries, timeout_seconds, max_snapshots, max_instances):
+    dataset = DS1000Dataset.from_hf(libraries=libraries, split="test")
+    env_py = str(
+        Path.cwd()
+        / ".ds1000env"
+        / ("Scripts" if os.name == "nt" else "bin")
+        / ("python.exe" if os.name == "nt" else "python")
+    )
+    critic_args = dict(
+        python_executable=env_py,
+        extra_env={"PYTHONHASHSEED": "0"},
+        timeout_seconds=timeout_seconds,
+    )
+
+    n_checked, n_failed, harnesses = 0, 0, Counter()
+    for n, instance in enumerate(dataset):
+        if n >= max_instances:
+            break
+        potential = DS1000RuntimeNoErrorSnapshotPotential(
+            code_context=instance.code_context,
+            max_snapshots=max_snapshots,
+            **critic_args,
+        )
+        reference = DS1000RuntimeNoErrorPotential(
+            code_context=instance.code_context, **critic_args
+        )
+        try:
+            disagreements = asyncio.run(
+                compare(instance.reference_code, potential, reference)
+            )
+        finally:
+            potential.close()
+        harnesses[potential.pool.harness] += 1
+        n_checked += 1
+        if disagreements:
+            n_failed += 1
+            print(f"Instance {instance.instance_id} ({potential.pool.harness}):")
+            for method, program, w, ref_w in disagreements:
+                print(f"  {method} {program!r}: snapshot {w}, reference {ref_w}")
+
+    print(f"Harnesses used by the snapshot critic: {dict(harnesses)}")
+    print(f"{n_failed} of {n_checked} reference solutions with disagreements.")
+    if n_failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
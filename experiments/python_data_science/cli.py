@@ -16,17 +16,39 @@ from experiments.common import (
     setup_model_and_params,
 )
 from experiments.util import make_prompt_formatter
+from experiments.datasets import load_dataset
+from experiments.python_data_science.snapshots import (
+    DS1000RuntimeNoErrorSnapshotPotential,
+)
 
 
 class DS1000PotentialFactory(PotentialFactory):
-    def __init__(self, env_py, timeout_s=15):
+    """
+    Produces the expensive (runtime no-error) potential; DS1000 has no fast potential.
+    With `snapshots`, the potential resumes execution from forked interpreter snapshots
+    of the program prefix instead of re-running the whole program for every candidate.
+    """
+
+    critic_boundary_bytes = b"\n"
+
+    def __init__(self, env_py, timeout_s=15, snapshots=False, max_snapshots=64):
         self.env_py = str(env_py)
         self.timeout_s = timeout_s
+        self.snapshots = snapshots
+        self.max_snapshots = max_snapshots
 
     def get_fast_potential(self, instance):  # No fast potential in DS1000
         pass
 
     def get_expensive_potential(self, instance):
+        if self.snapshots:
+            return DS1000RuntimeNoErrorSnapshotPotential(
+                code_context=instance.code_context,
+                python_executable=self.env_py,
+                extra_env={"PYTHONHASHSEED": "0"},
+                timeout_seconds=self.timeout_s,
+                max_snapshots=self.max_snapshots,
+            )
         return DS1000RuntimeNoErrorPotential(
             code_context=instance.code_context,
             python_executable=self.env_py,
@@ -53,12 +75,27 @@ class DS1000PotentialFactory(PotentialFactory):
     default=500,
     help="Maximum number of tokens to generate.",
 )
+@click.option(
+    "--snapshot-critic",
+    is_flag=True,
+    help="Check candidate lines by resuming from forked interpreter snapshots of the program prefix. Check it against the default critic with `check_snapshot_critic.py` first.",
+)
+@click.option(
+    "--max-snapshots",
+    default=64,
+    type=int,
+    help="Maximum number of live interpreter snapshots (with --snapshot-critic).",
+)
 def main(**kwargs):
     model_type = kwargs.pop("model_type")
 
     model_class, kwargs = setup_model_and_params(model_type, kwargs)
     libraries = kwargs.pop("libraries")
-    dataset = DS1000Dataset.from_hf(
+    snapshot_critic = kwargs.pop("snapshot_critic")
+    max_snapshots = kwargs.pop("max_snapshots")
+    dataset = load_dataset(
+        DS1000Dataset.from_hf,
+        cache_dir=kwargs.pop("dataset_cache_dir"),
         libraries=libraries,
         split="test",
     )
@@ -100,7 +137,9 @@ def main(**kwargs):
         dataset=dataset,
         model_class=model_class,
         evaluator=evaluator,
-        potential_factory=DS1000PotentialFactory(env_py=env_py),
+        potential_factory=DS1000PotentialFactory(
+            env_py=env_py, snapshots=snapshot_critic, max_snapshots=max_snapshots
+        ),
         cache_key_fn=cache_key_fn,
         eos_token_factory=eos_token_factory,
         prompt_formatter=prompt_formatter,
@@ -0,0 +1,123 @@
+"""Interpreter snapshot server for `DS1000RuntimeNoErrorSnapshotPotential`.
+
+Runs inside the DS1000 sandbox interpreter and uses only the standard library. Each
+snapshot is a live process holding the namespace of a program prefix; a `fork` request
+forks the snapshot, runs a new chunk of code in the child, and hands the manager a
+socket to the child, which then serves as the snapshot of the extended prefix.
+
+Messages are JSON objects sent over `SOCK_SEQPACKET` Unix sockets.
+
+Usage: python snapshot_server.py <socket fd>
+"""
+
+import contextlib
+import io
+import json
+import math
+import os
+import signal
+import socket
+import sys
+import traceback
+
+MAX_MESSAGE = 1 << 20
+
+
+def send(sock, msg, fds=()):
+    data = json.dumps(msg).encode()
+    if fds:
+        socket.send_fds(sock, [data], list(fds))
+    else:
+        sock.send(data)
+
+
+def _on_alarm(signum, frame):
+    raise TimeoutError("execution timed out")
+
+
+def run(code, env, timeout):
+    """Execute `code` in `env`, returning an error description or None."""
+    signal.alarm(max(1, math.ceil(timeout)))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            with contextlib.redirect_stderr(io.StringIO()):
+                exec(compile(code, "<solution>", "exec"), env)
+    except BaseException:
+        return traceback.format_exc(limit=1)
+    finally:
+        signal.alarm(0)
+    return None
+
+
+def make_root_env(code_context, timeout):
+    """Run the instance's code context, stopping where the solution is inserted.
+
+    DS1000 code contexts define an `exec_context` template with an `[insert]`
+    placeholder and a `generate_test_case` function; the solution runs after the
+    part of the template preceding the placeholder, with `test_input` in scope.
+    Without such a template, the solution runs after the code context itself.
+
+    Returns:
+        (tuple): The namespace the solution runs in, and which harness was used
+            ("exec_context" or "code_context"), reported to the manager.
+    """
+    env = {"__name__": "__main__"}
+    error = run(code_context, env, timeout)
+    if error is not None:
+        raise RuntimeError(error)
+    template = env.get("exec_context")
+    if not isinstance(template, str) or "[insert]" not in template:
+        return env, "code_context"
+    test_input, _ = env["generate_test_case"](1)
+    solution_env = {"__name__": "__main__", "test_input": test_input}
+    error = run(template.split("[insert]")[0], solution_env, timeout)
+    if error is not None:
+        raise RuntimeError(error)
+    return solution_env, "exec_context"
+
+
+def serve(sock, env, timeout):
+    while True:
+        try:
+            data = sock.recv(MAX_MESSAGE)
+        except OSError:
+            data = b""
+        if not data:
+            os._exit(0)
+        msg = json.loads(data)
+        if msg["op"] != "fork":
+            os._exit(0)
+
+        parent_end, child_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        pid = os.fork()
+        if pid == 0:
+            sock.close()
+            parent_end.close()
+            error = run(msg["code"], env, timeout)
+            send(child_end, {"ok": error is None, "error": error})
+            if error is not None:
+                os._exit(0)
+            serve(child_end, env, timeout)
+        child_end.close()
+        send(sock, {"pid": pid}, fds=[parent_end.fileno()])
+        parent_end.close()
+
+
+def main():
+    sock = socket.socket(fileno=int(sys.argv[1]))
+    # Snapshots are never waited on; let the kernel reap them.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+    init = json.loads(sock.recv(MAX_MESSAGE))
+    try:
+        env, harness = make_root_env(init["code_context"], init["timeout"])
+    except Exception as e:
+        send(sock, {"ok": False, "error": str(e)})
+        return
+    send(sock, {"ok": True, "error": None, "harness": harness})
+    serve(sock, env, init["timeout"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+import os
+import re
+import ast
+import json
+import codeop
+import signal
+import socket
+import asyncio
+import threading
+import subprocess
+from pathlib import Path
+from collections import OrderedDict
+from genlm.eval.domains.ds1000 import DS1000RuntimeNoErrorPotential
+
+SERVER_PATH = Path(__file__).with_name("snapshot_server.py")
+MAX_MESSAGE = 1 << 20
+
+_CONTINUATION = re.compile(r"(else|elif|except|finally)\b")
+_COMPOUND = (
+    ast.For,
+    ast.AsyncFor,
+    ast.While,
+    ast.If,
+    ast.With,
+    ast.AsyncWith,
+    ast.Try,
+    ast.TryStar,
+    ast.Match,
+    ast.FunctionDef,
+    ast.AsyncFunctionDef,
+    ast.ClassDef,
+)
+
+
+class SnapshotError(RuntimeError):
+    """Raised when a snapshot process cannot be used."""
+
+
+class _Snapshot:
+    """A live interpreter process holding the namespace of a program prefix."""
+
+    def __init__(self, sock, pid):
+        self.sock = sock
+        self.pid = pid
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.sock.close()  # the process exits when its socket closes
+
+
+class SnapshotPool:
+    """Fork-based interpreter checkpoints in the DS1000 sandbox interpreter.
+
+    The root snapshot is a `snapshot_server.py` process that has run the instance's
+    code context. Extending a snapshot with new code forks it and runs only that code
+    in the child, which becomes the snapshot of the extended program. Snapshots other
+    than the root are evicted least-recently-used first, so snapshots of particles that
+    died at resampling are reclaimed once `max_snapshots` is reached.
+
+    Args:
+        code_context (str): The instance's DS1000 code context.
+        python_executable (str): Python interpreter of the sandbox environment.
+        extra_env (dict, optional): Extra environment variables for the sandbox.
+        timeout_seconds (float): Timeout for running the code context or one chunk of code.
+        max_snapshots (int): Maximum number of live snapshots, excluding the root.
+    """
+
+    def __init__(
+        self,
+        code_context,
+        python_executable,
+        extra_env=None,
+        timeout_seconds=15.0,
+        max_snapshots=64,
+    ):
+        self.code_context = code_context
+        self.python_executable = python_executable
+        self.extra_env = extra_env or {}
+        self.timeout_seconds = timeout_seconds
+        self.max_snapshots = max_snapshots
+        self._process = None
+        self._root = None
+        self._root_error = None
+        # "exec_context" or "code_context": how the root snapshot set up the solution's namespace.
+        self.harness = None
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def root(self):
+        """The snapshot after the code context, or None if the code context fails."""
+        with self._lock:
+            if self._process is None:
+                self._start()
+        return self._root
+
+    def _start(self):
+        sock, server_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._process = subprocess.Popen(
+            [self.python_executable, str(SERVER_PATH), str(server_sock.fileno())],
+            pass_fds=(server_sock.fileno(),),
+            env={**os.environ, **self.extra_env},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        server_sock.close()
+        sock.send(
+            json.dumps(
+                {"code_context": self.code_context, "timeout": self.timeout_seconds}
+            ).encode()
+        )
+        sock.settimeout(self.timeout_seconds + 5)
+        try:
+            reply = json.loads(sock.recv(MAX_MESSAGE) or b"{}")
+        except socket.timeout:
+            reply = {"error": "timed out running the code context"}
+        sock.settimeout(None)
+        if reply.get("ok"):
+            self._root = _Snapshot(sock, self._process.pid)
+            self.harness = reply.get("harness")
+        else:
+            self._root_error = reply.get("error", "snapshot server exited")
+            sock.close()
+
+    def extend(self, parent, code):
+        """Run `code` on top of `parent`.
+
+        Returns:
+            (_Snapshot | None): The snapshot of the extended program, or None if `code` raised.
+
+        Raises:
+            SnapshotError: If `parent` has been evicted or its process is gone.
+        """
+        with parent.lock:
+            if parent.closed:
+                raise SnapshotError("parent snapshot was evicted")
+            try:
+                parent.sock.send(json.dumps({"op": "fork", "code": code}).encode())
+                msg, fds, _, _ = socket.recv_fds(parent.sock, MAX_MESSAGE, 1)
+            except OSError as e:
+                raise SnapshotError("parent snapshot process is gone") from e
+        if not fds:
+            raise SnapshotError("parent snapshot process is gone")
+
+        pid = json.loads(msg)["pid"]
+        sock = socket.socket(fileno=fds[0])
+        sock.settimeout(self.timeout_seconds + 5)
+        try:
+            reply = json.loads(sock.recv(MAX_MESSAGE) or b"{}")
+        except socket.timeout:
+            # Stuck outside the interpreter's reach (e.g. in native code).
+            os.kill(pid, signal.SIGKILL)
+            reply = {}
+        sock.settimeout(None)
+        if not reply.get("ok"):
+            sock.close()
+            return None
+
+        snapshot = _Snapshot(sock, pid)
+        with self._lock:
+            self._snapshots[id(snapshot)] = snapshot
+            evicted = []
+            while len(self._snapshots) > self.max_snapshots:
+                evicted.append(self._snapshots.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+        return snapshot
+
+    def touch(self, snapshot):
+        """Mark `snapshot` as recently used. Returns False if it has been evicted."""
+        if snapshot is self._root:
+            return True
+        with self._lock:
+            if id(snapshot) not in self._snapshots:
+                return False
+            self._snapshots.move_to_end(id(snapshot))
+            return True
+
+    def close(self):
+        with self._lock:
+            snapshots = list(self._snapshots.values())
+            self._snapshots.clear()
+        for snapshot in snapshots:
+            snapshot.close()
+        if self._root is not None:
+            self._root.close()
+        if self._process is not None:
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+
+
+def _source(lines):
+    return "\n".join(lines) + "\n"
+
+
+def _starts_statement(line):
+    """Whether `line` starts a new top-level statement, closing any open block."""
+    stripped = line.strip()
+    return (
+        bool(stripped)
+        and line[0] not in " \t"
+        and not stripped.startswith("#")
+        and not _CONTINUATION.match(stripped)
+    )
+
+
+def _compiles(source):
+    try:
+        compile(source, "<solution>", "exec")
+    except (SyntaxError, ValueError):
+        return False
+    return True
+
+
+def _program(context):
+    return b"".join(
+        bytes([t]) if isinstance(t, int) else bytes(t) for t in context
+    ).decode("utf-8", errors="replace")
+
+
+class DS1000RuntimeNoErrorSnapshotPotential(DS1000RuntimeNoErrorPotential):
+    """`DS1000RuntimeNoErrorPotential` that resumes execution from interpreter snapshots.
+
+    Rather than re-running the code context and the whole program for every candidate,
+    the program is executed statement by statement in a `SnapshotPool`: checking a
+    program resumes from the snapshot of its longest already-checked line prefix and
+    runs only the new statements. Compound statements are run once their block is
+    closed by a dedented line (or at completion), as in the interactive interpreter.
+
+    Args:
+        code_context (str): The instance's DS1000 code context.
+        python_executable (str): Python interpreter of the sandbox environment.
+        extra_env (dict, optional): Extra environment variables for the sandbox.
+        timeout_seconds (float): Timeout for running the code context or one statement.
+        max_snapshots (int): Maximum number of live snapshot processes.
+        max_cache_size (int): Maximum number of checked line prefixes remembered.
+    """
+
+    def __init__(
+        self,
+        code_context,
+        python_executable,
+        extra_env=None,
+        timeout_seconds=15.0,
+        max_snapshots=64,
+        max_cache_size=10_000,
+    ):
+        super().__init__(
+            code_context=code_context,
+            python_executable=python_executable,
+            extra_env=extra_env,
+            timeout_seconds=timeout_seconds,
+        )
+        self.pool = SnapshotPool(
+            code_context=code_context,
+            python_executable=python_executable,
+            extra_env=extra_env,
+            timeout_seconds=timeout_seconds,
+            max_snapshots=max_snapshots,
+        )
+        self.max_cache_size = max_cache_size
+        # Text of a program up to a line boundary -> (snapshot or None if it failed, unexecuted lines).
+        self._nodes = OrderedDict()
+        self._nodes_lock = threading.Lock()
+
+    async def prefix(self, context):
+        ok = await asyncio.to_thread(self._check, _program(context), False)
+        return 0.0 if ok else float("-inf")
+
+    async def complete(self, context):
+        ok = await asyncio.to_thread(self._check, _program(context), True)
+        return 0.0 if ok else float("-inf")
+
+    def close(self):
+        """Terminate all snapshot processes."""
+        self.pool.close()
+
+    def _check(self, program, final):
+        try:
+            return self._run(program, final, resume=True)
+        except SnapshotError:
+            # A snapshot was evicted under us; replay from the root.
+            return self._run(program, final, resume=False)
+
+    def _run(self, program, final, resume):
+        ends = [m.end() for m in re.finditer("\n", program)]
+        if final and not program.endswith("\n"):
+            ends.append(len(program))
+        lines = [
+            program[start:end].rstrip("\n") for start, end in zip([0] + ends[:-1], ends)
+        ]
+
+        k, node = 0, None
+        if resume:
+            for k in range(len(ends), 0, -1):
+                node = self._lookup(program[: ends[k - 1]])
+                if node is not None:
+                    break
+            else:
+                k = 0
+        if node is None:
+            root = self.pool.root
+            node = (root, ())
+
+        snapshot, pending = node
+        for i in range(k, len(lines)):
+            if snapshot is None:
+                return False
+            snapshot, pending = self._feed(snapshot, pending, lines[i])
+            self._store(program[: ends[i]], (snapshot, pending))
+
+        if snapshot is None:
+            return False
+        if final and pending:
+            source = _source(pending)
+            return _compiles(source) and self.pool.extend(snapshot, source) is not None
+        return True
+
+    def _lookup(self, key):
+        with self._nodes_lock:
+            node = self._nodes.get(key)
+            if node is None:
+                return None
+            self._nodes.move_to_end(key)
+        if node[0] is not None and not self.pool.touch(node[0]):
+            return None
+        return node
+
+    def _store(self, key, node):
+        with self._nodes_lock:
+            self._nodes[key] = node
+            if len(self._nodes) > self.max_cache_size:
+                self._nodes.popitem(last=False)
+
+    def _feed(self, snapshot, pending, line):
+        """Add one line to the program, executing every statement it completes."""
+        if pending and _starts_statement(line):
+            source = _source(pending)
+            if _compiles(source):
+                snapshot = self.pool.extend(snapshot, source)
+                if snapshot is None:
+                    return None, ()
+                pending = ()
+
+        if not pending and (not line.strip() or line.strip().startswith("#")):
+            return snapshot, pending
+
+        pending = pending + (line,)
+        source = _source(pending)
+        try:
+            code = codeop.compile_command(source, "<solution>", "exec")
+        except (SyntaxError, ValueError, OverflowError):
+            return None, ()
+        if code is None or isinstance(ast.parse(source).body[-1], _COMPOUND):
+            # Incomplete, or a block that later indented lines may extend.
+            return snapshot, pending
+        return self.pool.extend(snapshot, source), ()
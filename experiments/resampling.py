@@ -0,0 +1,122 @@
+import numpy as np
+
+
+def normalize_log_weights(log_weights):
+    """Normalized probabilities from unnormalized log-weights, computed stably with log-sum-exp.
+
+    Args:
+        log_weights (array-like): Log-weights, possibly containing -inf.
+
+    Returns:
+        (np.ndarray): Probabilities summing to 1.
+
+    Raises:
+        ValueError: If all log-weights are -inf.
+    """
+    log_weights = np.asarray(log_weights, dtype=float)
+    m = np.max(log_weights)
+    if not np.isfinite(m):
+        raise ValueError("Cannot resample: all log-weights are -inf.")
+    probs = np.exp(log_weights - m)
+    return probs / probs.sum()
+
+
+def _inverse_cdf(probs, positions):
+    """Indices `i` with `cdf[i-1] <= u < cdf[i]` for each `u` in `positions`."""
+    cdf = np.cumsum(probs)
+    cdf[-1] = 1.0  # avoid round-off errors
+    # Particles with zero probability are never selected, even at ties.
+    return np.searchsorted(cdf, positions, side="right").astype(np.int64)
+
+
+def _rng(rng):
+    return np.random if rng is None else rng
+
+
+def multinomial_from_probs(probs, rng=None):
+    """Multinomial resampling: `N` independent draws from `probs`."""
+    n = len(probs)
+    probs = np.asarray(probs, dtype=float)
+    counts = _rng(rng).multinomial(n, probs / probs.sum())
+    return np.repeat(np.arange(n), counts)
+
+
+def systematic_from_probs(probs, rng=None):
+    """Systematic resampling: `N` evenly spaced positions with one random offset."""
+    n = len(probs)
+    return _inverse_cdf(probs, (_rng(rng).random() + np.arange(n)) / n)
+
+
+def stratified_from_probs(probs, rng=None):
+    """Stratified resampling: one uniform position in each of `N` equal strata."""
+    n = len(probs)
+    return _inverse_cdf(probs, (_rng(rng).random(n) + np.arange(n)) / n)
+
+
+def residual_from_probs(probs, rng=None):
+    """Residual resampling: `floor(N * p_i)` copies of each particle, and multinomial draws from the residuals."""
+    n = len(probs)
+    scaled = n * np.asarray(probs, dtype=float)
+    copies = np.floor(scaled).astype(np.int64)
+    indices = np.repeat(np.arange(n), copies)
+    n_rest = n - len(indices)
+    if n_rest == 0:
+        return indices
+    residual = scaled - copies
+    counts = _rng(rng).multinomial(n_rest, residual / residual.sum())
+    return np.concatenate([indices, np.repeat(np.arange(n), counts)])
+
+
+_KERNELS = {
+    "multinomial": multinomial_from_probs,
+    "systematic": systematic_from_probs,
+    "stratified": stratified_from_probs,
+    "residual": residual_from_probs,
+}
+
+
+def resample(log_weights, method="systematic", rng=None):
+    """Resample ancestor indices from unnormalized log-weights.
+
+    All methods are unbiased: the expected number of copies of particle `i` is
+    `N * p_i`, where `p_i` are the normalized weights. They differ in the variance of
+    the number of copies, with multinomial > stratified, residual > systematic in practice.
+
+    Args:
+        log_weights (array-like): Log-weights of the `N` particles.
+        method (str): One of "multinomial", "systematic", "stratified", "residual".
+        rng (np.random.Generator, optional): Random number generator. Defaults to NumPy's global state.
+
+    Returns:
+        (np.ndarray): `N` ancestor indices.
+    """
+    if method not in _KERNELS:
+        raise ValueError(
+            f"Unknown resampling method '{method}'. Must be one of: {', '.join(_KERNELS)}"
+        )
+    return _KERNELS[method](normalize_log_weights(log_weights), rng)
+
+
+def register_resampling_methods(prefix="vectorized-"):
+    """Make the kernels selectable with `--resampling-method`, as `vectorized-<method>`.
+
+    The kernels are added to the resampling registries of `genlm.control` and `llamppl`,
+    whichever are installed. Registered functions take normalized probabilities, as the
+    registries expect, and use NumPy's global random state.
+    """
+    registries = []
+    try:
+        from genlm.control.sampler import resampling
+
+        registries.append(resampling.RESAMPLING_METHODS)
+    except (ImportError, AttributeError):
+        pass
+    try:
+        from llamppl.inference import resampling
+
+        registries.append(resampling.RESAMPLING_METHODS)
+    except (ImportError, AttributeError):
+        pass
+    for registry in registries:
+        for name, kernel in _KERNELS.items():
+            registry[prefix + name] = kernel
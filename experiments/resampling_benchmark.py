@@ -0,0 +1,105 @@
+import time
+import click
+import numpy as np
+
+from experiments.resampling import normalize_log_weights, resample
+
+
+def _reference_methods():
+    """The non-vectorized implementations used by default, if installed."""
+    try:
+        from genlm.control.sampler.resampling import RESAMPLING_METHODS
+    except ImportError:
+        try:
+            from llamppl.inference.resampling import RESAMPLING_METHODS
+        except ImportError:
+            return {}
+    return {
+        name: fn
+        for name, fn in RESAMPLING_METHODS.items()
+        if not name.startswith("vectorized-")
+    }
+
+
+def _seconds_per_call(fn, n_calls):
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        fn()
+    return (time.perf_counter() - start) / n_calls
+
+
+def offspring_variance(log_weights, method, n_repeats, rng):
+    """Average variance of the number of copies of each particle, and largest deviation of its mean from `N * p_i`."""
+    n = len(log_weights)
+    counts = np.stack(
+        [
+            np.bincount(resample(log_weights, method, rng), minlength=n)
+            for _ in range(n_repeats)
+        ]
+    )
+    expected = n * normalize_log_weights(log_weights)
+    return counts.var(axis=0).mean(), np.abs(counts.mean(axis=0) - expected).max()
+
+
+@click.command(
+    help="Benchmark the vectorized resampling kernels and compare their variance."
+)
+@click.option(
+    "--n-particles",
+    "n_particles_list",
+    default=[16, 128, 1024, 8192],
+    multiple=True,
+    type=int,
+    help="Particle counts to benchmark (can be repeated).",
+)
+@click.option(
+    "--weight-scale",
+    default=2.0,
+    type=float,
+    help="Standard deviation of the Gaussian log-weights.",
+)
+@click.option(
+    "--n-calls",
+    default=200,
+    type=int,
+    help="Number of calls timed per method and particle count.",
+)
+@click.option(
+    "--n-repeats",
+    default=2000,
+    type=int,
+    help="Number of resampling runs used to estimate the variance.",
+)
+@click.option("--seed", default=0, type=int, help="Random seed.")
+def main(n_particles_list, weight_scale, n_calls, n_repeats, seed):
+    rng = np.random.default_rng(seed)
+    references = _reference_methods()
+    methods = ["multinomial", "stratified", "residual", "systematic"]
+
+    print(
+        f"{'N':>6} {'method':>12} {'vectorized us':>14} {'reference us':>13} "
+        f"{'offspring var':>14} {'max bias':>9}"
+    )
+    for n in n_particles_list:
+        log_weights = rng.normal(scale=weight_scale, size=n)
+        probs = normalize_log_weights(log_weights)
+        for method in methods:
+            vectorized = _seconds_per_call(
+                lambda: resample(log_weights, method, rng), n_calls
+            )
+            if method in references:
+                reference = _seconds_per_call(
+                    lambda: references[method](probs), n_calls
+                )
+                reference = f"{reference * 1e6:13.1f}"
+            else:
+                reference = f"{'-':>13}"
+            variance, bias = offspring_variance(log_weights, method, n_repeats, rng)
+            print(
+                f"{n:>6} {method:>12} {vectorized * 1e6:14.1f} {reference} "
+                f"{variance:14.4f} {bias:9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import asyncio
+import click
+from genlm.eval.domains.spider import SpiderDataset, SpiderTableColumnVerifier
+
+from experiments.text_to_sql.schema_index import (
+    SchemaIndex,
+    IncrementalTableColumnVerifier,
+)
+
+
+def _cuts(query, every_byte):
+    """Prefix lengths of `query` to check: every byte, or every whitespace boundary."""
+    if every_byte:
+        return range(1, len(query))
+    return [i for i in range(1, len(query)) if query[i : i + 1].isspace()]
+
+
+async def compare(instance, verifier, reference, every_byte):
+    """Contexts of the gold query of `instance` on which the two verifiers disagree."""
+    query = instance.gold.encode()
+    disagreements = []
+    for cut in _cuts(query, every_byte):
+        w, ref_w = await asyncio.gather(
+            verifier.prefix(query[:cut]), reference.prefix(query[:cut])
+        )
+        if (w == 0) != (ref_w == 0):
+            disagreements.append(("prefix", query[:cut], w, ref_w))
+    w, ref_w = await asyncio.gather(verifier.complete(query), reference.complete(query))
+    if (w == 0) != (ref_w == 0):
+        disagreements.append(("complete", query, w, ref_w))
+    return disagreements
+
+
+@click.command(
+    help="Check that IncrementalTableColumnVerifier agrees with SpiderTableColumnVerifier on the gold queries."
+)
+@click.option(
+    "--spider-data-dir",
+    default="spider_data",
+    help="Path to the Spider dataset directory.",
+)
+@click.option(
+    "--spider-grammar-path",
+    default="grammars.json",
+    help="Path to the Spider grammar file.",
+)
+@click.option(
+    "--every-byte",
+    is_flag=True,
+    help="Compare on every prefix of each query instead of every whitespace boundary.",
+)
+@click.option(
+    "--max-instances",
+    default=100000,
+    type=int,
+    help="Maximum number of instances to check.",
+)
+def main(spider_data_dir, spider_grammar_path, every_byte, max_instances):
+    dataset = SpiderDataset.from_spider_dir(spider_data_dir, spider_grammar_path)
+    verifiers = {}
+    n_checked, n_failed = 0, 0
+    for n, instance in enumerate(dataset):
+        if n >= max_instances:
+            break
+        if instance.schema_name not in verifiers:
+            verifiers[instance.schema_name] = IncrementalTableColumnVerifier(
+                SchemaIndex(instance.tables)
+            )
+        reference = SpiderTableColumnVerifier(
+            grammar=instance.lark_grammar, tables=instance.tables
+        )
+        disagreements = asyncio.run(
+            compare(instance, verifiers[instance.schema_name], reference, every_byte)
+        )
+        n_checked += 1
+        if disagreements:
+            n_failed += 1
+            print(f"Instance {instance.instance_id} ({instance.schema_name}):")
+            for method, context, w, ref_w in disagreements:
+                print(f"  {method} {context!r}: incremental {w}, reference {ref_w}")
+
+    print(f"{n_failed} of {n_checked} gold queries with disagreements.")
+    if n_failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
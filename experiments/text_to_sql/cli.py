@@ -15,16 +15,40 @@ from experiments.common import (
     setup_model_and_params,
 )
 from experiments.util import make_prompt_formatter
+from experiments.datasets import load_dataset
+from experiments.text_to_sql.evaluation import CachedSpiderEvaluator
+from experiments.text_to_sql.schema_index import (
+    SchemaIndex,
+    IncrementalTableColumnVerifier,
+)
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 
 class SpiderPotentialFactory(PotentialFactory):
+    """
+    Produces the fast (schema grammar) and expensive (table/column verification) potentials.
+    With `incremental_verifier`, the expensive potential is an `IncrementalTableColumnVerifier`
+    built once per database and shared by every instance on it.
+    """
+
+    critic_boundary_bytes = b" \t\n,)"
+
+    def __init__(self, incremental_verifier: bool = False):
+        self.incremental_verifier = incremental_verifier
+        self._verifiers = {}
+
     def get_fast_potential(self, instance):
         assert instance.lark_grammar is not None
         return BoolCFG.from_lark(instance.lark_grammar)
 
     def get_expensive_potential(self, instance):
+        if self.incremental_verifier:
+            if instance.schema_name not in self._verifiers:
+                self._verifiers[instance.schema_name] = IncrementalTableColumnVerifier(
+                    SchemaIndex(instance.tables)
+                )
+            return self._verifiers[instance.schema_name]
         assert instance.lark_grammar is not None
         return SpiderTableColumnVerifier(
             grammar=instance.lark_grammar, tables=instance.tables
@@ -48,15 +72,36 @@ class SpiderPotentialFactory(PotentialFactory):
     default="grammars.json",
     help="Path to the Spider grammar file.",
 )
+@click.option(
+    "--incremental-verifier",
+    is_flag=True,
+    help="Use a per-database precomputed schema index and incremental table/column verifier as the expensive potential. Check it against the default verifier with `check_verifier.py` first.",
+)
+@click.option(
+    "--sql-cache-path",
+    default=None,
+    help="SQLite file caching SQL execution results across runs. If set, queries are executed against in-memory copies of the databases and their results are cached.",
+)
 @common_options
 def main(**kwargs):
     model_type = kwargs.pop("model_type")
     data_dir = kwargs.pop("spider_data_dir")
     grammar_path = kwargs.pop("spider_grammar_path")
+    incremental_verifier = kwargs.pop("incremental_verifier")
+    sql_cache_path = kwargs.pop("sql_cache_path")
 
     model_class, kwargs = setup_model_and_params(model_type, kwargs)
-    dataset = SpiderDataset.from_spider_dir(data_dir, grammar_path)
-    evaluator = SpiderEvaluator(data_dir)
+    dataset = load_dataset(
+        SpiderDataset.from_spider_dir,
+        data_dir,
+        grammar_path,
+        cache_dir=kwargs.pop("dataset_cache_dir"),
+        source_paths=[data_dir, grammar_path],
+    )
+    if sql_cache_path is not None:
+        evaluator = CachedSpiderEvaluator(data_dir, cache_path=sql_cache_path)
+    else:
+        evaluator = SpiderEvaluator(data_dir)
 
     def cache_key_fn(instance):
         return instance.schema_name
@@ -69,7 +114,9 @@ def main(**kwargs):
         dataset=dataset,
         model_class=model_class,
         evaluator=evaluator,
-        potential_factory=SpiderPotentialFactory(),
+        potential_factory=SpiderPotentialFactory(
+            incremental_verifier=incremental_verifier
+        ),
         cache_key_fn=cache_key_fn,
         prompt_formatter=prompt_formatter,
         **kwargs,
@@ -0,0 +1,275 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from genlm.eval.domains.spider import SpiderEvaluator
+
+from experiments.cache import PersistentCache
+
+# Splits a query into string literals and the text between them.
+_LITERALS = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+
+def normalize_sql(sql):
+    """Normalize `sql` up to case and whitespace outside of string literals, and trailing semicolons."""
+    parts = _LITERALS.split(sql.strip().rstrip(";").strip())
+    return "".join(
+        part if i % 2 else re.sub(r"\s+", " ", part).lower()
+        for i, part in enumerate(parts)
+    )
+
+
+# The original `sqlite3.connect`, which `routed_connections` temporarily replaces.
+_sqlite3_connect = sqlite3.connect
+# Error classes restored when a cached query fails again.
+_ERRORS = {
+    cls.__name__: cls
+    for cls in (
+        sqlite3.Warning,
+        sqlite3.Error,
+        sqlite3.InterfaceError,
+        sqlite3.DatabaseError,
+        sqlite3.DataError,
+        sqlite3.OperationalError,
+        sqlite3.IntegrityError,
+        sqlite3.InternalError,
+        sqlite3.ProgrammingError,
+        sqlite3.NotSupportedError,
+    )
+}
+
+
+def _lenient_text(b):
+    return b.decode(errors="ignore")
+
+
+class SpiderExecutionCache:
+    """Executes SQL against read-only in-memory copies of the Spider databases, caching results.
+
+    Each database is copied into a shared in-memory database the first time it is used
+    and kept for the lifetime of the cache. Execution results (rows and column
+    description, or the error) are cached by `(db_id, normalize_sql(sql))` in a
+    `PersistentCache`, so that repeated queries across responses, replicates, model types
+    and runs are not executed again.
+
+    Args:
+        db_dir (str): Directory with one `{db_id}/{db_id}.sqlite` database per schema.
+        cache_path (str, optional): SQLite file persisting the results. If None, results are cached in memory only.
+        timeout_seconds (float): Maximum execution time of one query.
+    """
+
+    def __init__(self, db_dir, cache_path=None, timeout_seconds=30.0):
+        self.db_dir = db_dir
+        self.timeout_seconds = timeout_seconds
+        self.results = PersistentCache(cache_path)
+        self._connections = {}
+        self._db_locks = {}
+        self._lock = threading.Lock()
+
+    def _uri(self, db_id):
+        return f"file:spider-{id(self)}-{db_id}?mode=memory&cache=shared"
+
+    def _connection(self, db_id):
+        """The connection that keeps the in-memory copy of `db_id` alive, and its lock."""
+        with self._lock:
+            if db_id not in self._connections:
+                path = os.path.join(self.db_dir, db_id, f"{db_id}.sqlite")
+                source = _sqlite3_connect(f"file:{path}?mode=ro", uri=True)
+                conn = _sqlite3_connect(
+                    self._uri(db_id), uri=True, check_same_thread=False
+                )
+                source.backup(conn)
+                source.close()
+                conn.text_factory = _lenient_text
+                conn.execute("PRAGMA query_only = ON")
+                self._connections[db_id] = conn
+                self._db_locks[db_id] = threading.Lock()
+            return self._connections[db_id], self._db_locks[db_id]
+
+    def connect(self, db_id):
+        """A new `sqlite3.Connection` to the in-memory copy of `db_id`, whose plain queries go through the cache."""
+        self._connection(db_id)
+        conn = _sqlite3_connect(
+            self._uri(db_id),
+            uri=True,
+            check_same_thread=False,
+            factory=CachedConnection,
+        )
+        conn.executions = self
+        conn.db_id = db_id
+        conn.text_factory = _lenient_text
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def execute(self, db_id, sql):
+        """Return `("ok", rows, description)` or `("error", (error class name, message), None)` for `sql` on `db_id`.
+
+        Queries interrupted by the timeout are not cached, so that they are retried
+        (e.g. on a less loaded machine) rather than counted as errors in later runs.
+        """
+        key = (db_id, normalize_sql(sql))
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        conn, lock = self._connection(db_id)
+        deadline = time.monotonic() + self.timeout_seconds
+        timed_out = False
+        with lock:
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, 10_000)
+            try:
+                cursor = conn.execute(sql)
+                result = ("ok", cursor.fetchall(), cursor.description)
+            except (sqlite3.Error, sqlite3.Warning) as e:
+                result = ("error", (type(e).__name__, str(e)), None)
+                timed_out = time.monotonic() > deadline
+            finally:
+                conn.set_progress_handler(None, 0)
+        if not timed_out:
+            self.results.set(key, result)
+        return result
+
+
+def _is_read_query(sql):
+    return normalize_sql(sql).lstrip("(").startswith(("select", "with"))
+
+
+class CachedCursor(sqlite3.Cursor):
+    """A `sqlite3.Cursor` whose unparameterized `SELECT` queries are answered by a `SpiderExecutionCache`.
+
+    Everything else (other statements such as `PRAGMA`, parameterized queries,
+    `executemany`, `executescript`) runs on the underlying in-memory database as usual.
+    """
+
+    _rows = None
+    _description = None
+
+    def execute(self, sql, parameters=()):
+        if parameters or not _is_read_query(sql):
+            self._rows = None
+            return super().execute(sql, parameters)
+        status, result, description = self.connection.executions.execute(
+            self.connection.db_id, sql
+        )
+        if status != "ok":
+            self._rows = None
+            name, message = result
+            raise _ERRORS.get(name, sqlite3.Error)(message)
+        self._rows, self._description = list(result), description
+        return self
+
+    @property
+    def description(self):
+        return super().description if self._rows is None else self._description
+
+    @property
+    def rowcount(self):
+        return super().rowcount if self._rows is None else -1
+
+    def fetchone(self):
+        if self._rows is None:
+            return super().fetchone()
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size=None):
+        if self._rows is None:
+            return super().fetchmany(self.arraysize if size is None else size)
+        size = self.arraysize if size is None else size
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self):
+        if self._rows is None:
+            return super().fetchall()
+        rows, self._rows = self._rows, []
+        return rows
+
+    def __next__(self):
+        if self._rows is None:
+            return super().__next__()
+        if not self._rows:
+            raise StopIteration
+        return self._rows.pop(0)
+
+
+class CachedConnection(sqlite3.Connection):
+    """A `sqlite3.Connection` to an in-memory Spider database whose cursors are `CachedCursor`s.
+
+    Created by `SpiderExecutionCache.connect`, which sets `executions` and `db_id`.
+    """
+
+    def cursor(self, factory=CachedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+
+_routing = threading.local()
+_routing_lock = threading.Lock()
+_n_routing = 0
+
+
+def _connect(database, *args, **kwargs):
+    """`sqlite3.connect`, except for Spider databases opened by a thread inside `CachedSpiderEvaluator.evaluate_sample`."""
+    executions = getattr(_routing, "executions", None)
+    if executions is not None and isinstance(database, (str, os.PathLike)):
+        db_dir, name = os.path.split(os.path.abspath(database))
+        root, db_id = os.path.split(db_dir)
+        if root == os.path.abspath(executions.db_dir) and name == f"{db_id}.sqlite":
+            return executions.connect(db_id)
+    return _sqlite3_connect(database, *args, **kwargs)
+
+
+@contextmanager
+def routed_connections(executions):
+    """Within the block, `sqlite3.connect` calls made by this thread on the databases of
+    `executions.db_dir` return `executions.connect(db_id)`.
+
+    `sqlite3.connect` is replaced only while at least one thread is in such a block.
+    Code that imported `connect` directly, or that runs in other threads or processes,
+    opens the databases on disk as usual.
+    """
+    global _n_routing
+    with _routing_lock:
+        if _n_routing == 0:
+            sqlite3.connect = _connect
+        _n_routing += 1
+    previous, _routing.executions = getattr(_routing, "executions", None), executions
+    try:
+        yield
+    finally:
+        _routing.executions = previous
+        with _routing_lock:
+            _n_routing -= 1
+            if _n_routing == 0:
+                sqlite3.connect = _sqlite3_connect
+
+
+class CachedSpiderEvaluator(SpiderEvaluator):
+    """`SpiderEvaluator` whose database queries go through a `SpiderExecutionCache`.
+
+    Scoring (query comparison, descriptions and metadata) is `SpiderEvaluator`'s own.
+    While it scores a sample, the Spider databases it opens with `sqlite3.connect` are
+    real connections to in-memory copies of the databases, whose queries are looked up
+    in the execution cache.
+
+    Args:
+        spider_data_dir (str): Path to the Spider dataset directory.
+        cache_path (str, optional): SQLite file persisting execution results across runs.
+        timeout_seconds (float): Maximum execution time of one query.
+    """
+
+    def __init__(self, spider_data_dir, cache_path=None, timeout_seconds=30.0):
+        super().__init__(spider_data_dir)
+        self.executions = SpiderExecutionCache(
+            os.path.join(spider_data_dir, "database"),
+            cache_path=cache_path,
+            timeout_seconds=timeout_seconds,
+        )
+
+    def evaluate_sample(self, instance, response):
+        with routed_connections(self.executions):
+            return super().evaluate_sample(instance, response)
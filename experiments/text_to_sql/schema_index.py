@@ -0,0 +1,371 @@
+import threading
+from dataclasses import dataclass, field, replace
+from collections import OrderedDict
+from genlm.control import Potential
+
+
+def _prefixes(words):
+    """All prefixes (including the empty string) of each word in `words`."""
+    return frozenset(w[:i] for w in words for i in range(len(w) + 1))
+
+
+class SchemaIndex:
+    """Precomputed lookup tables for the tables and columns of one Spider database.
+
+    Names are stored lowercased (SQL identifiers are case-insensitive), as hashed
+    sets for membership tests and as prefix sets (flattened tries) for checking
+    identifiers that are still being generated.
+
+    Args:
+        tables (list): The schema's tables, each with a `name` and `columns`, as in `SpiderInstance.tables`.
+    """
+
+    def __init__(self, tables):
+        self.table_columns = {
+            table.name.lower(): frozenset(
+                column.name.lower() for column in table.columns
+            )
+            for table in tables
+        }
+        self.columns = frozenset().union(*self.table_columns.values())
+        self.table_prefixes = _prefixes(self.table_columns)
+        self.column_prefixes = _prefixes(self.columns)
+        self.table_column_prefixes = {
+            name: _prefixes(columns) for name, columns in self.table_columns.items()
+        }
+
+    def is_table(self, name):
+        return name in self.table_columns
+
+    def has_column(self, table, column):
+        return column in self.table_columns[table]
+
+
+# Keywords after which the next identifier names a table.
+_TABLE_KEYWORDS = frozenset({"from", "join"})
+# Keywords that end a FROM clause, after which commas no longer separate tables.
+_CLAUSE_KEYWORDS = frozenset(
+    {
+        "select",
+        "where",
+        "group",
+        "order",
+        "having",
+        "limit",
+        "on",
+        "union",
+        "intersect",
+        "except",
+    }
+)
+# Words that may follow a table name without being its alias.
+_NOT_ALIASES = (
+    _CLAUSE_KEYWORDS
+    | _TABLE_KEYWORDS
+    | {"as", "inner", "left", "right", "outer", "cross", "natural", "full", "using"}
+)
+# Other keywords and functions that may appear as bare words in Spider queries.
+_SQL_WORDS = _NOT_ALIASES | {
+    "by",
+    "and",
+    "or",
+    "not",
+    "in",
+    "like",
+    "between",
+    "is",
+    "null",
+    "distinct",
+    "asc",
+    "desc",
+    "exists",
+    "all",
+    "any",
+    "case",
+    "when",
+    "then",
+    "else",
+    "end",
+    "cast",
+    "true",
+    "false",
+    "count",
+    "max",
+    "min",
+    "avg",
+    "sum",
+    "abs",
+    "round",
+    "length",
+    "lower",
+    "upper",
+    "substr",
+    "date",
+    "julianday",
+    "strftime",
+    "coalesce",
+    "ifnull",
+    "integer",
+    "int",
+    "real",
+    "text",
+}
+_SPACE_BYTES = frozenset(b" \t\r\n")
+_IDENT_BYTES = frozenset(
+    b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_"
+)
+
+
+@dataclass(frozen=True)
+class _ScanState:
+    """State of the scanner after consuming a byte prefix of the query.
+
+    States are never mutated in place, so that one state can be shared by every
+    particle whose query extends the same prefix.
+    """
+
+    word: bytes = b""  # identifier currently being read
+    quote: int | None = None  # open string literal delimiter
+    expect: str | None = None  # "table", "alias" or "alias?" for the next identifier
+    in_from: bool = False
+    qualifier: str | None = None  # `T1` while reading the column of `T1.col`
+    last_table: str | None = None
+    aliases: dict = field(default_factory=dict)  # alias -> table
+    pending: frozenset = frozenset()  # (alias, column) not yet matched to a table
+    bare_columns: frozenset = frozenset()
+    unknown_words: frozenset = (
+        frozenset()
+    )  # bare words that must turn out to be aliases
+    undecided: str | None = None  # bare word that may still be followed by `(`
+    referenced_tables: frozenset = frozenset()
+    failed: bool = False
+
+
+class IncrementalTableColumnVerifier(Potential):
+    """Checks that the tables and columns referenced by a (partial) SQL query exist in the schema.
+
+    The query is scanned left to right with a small lexer; the scanner state is cached
+    per checked prefix, so checking an extension of a previously checked query resumes
+    from that prefix and only scans the new bytes. A single verifier (and its cache) can
+    be shared by every instance on the same database.
+
+    Checks made while the query is a prefix:
+
+    - Identifiers after `FROM`/`JOIN` (or after any comma in a `FROM` clause) name a table.
+    - In `q.col`, `col` is a column of table `q`, or of the table aliased by `q`. Alias
+      references that cannot be matched yet are deferred until the alias is bound.
+    - The identifier being generated is a prefix of a name that would pass the above.
+    - A word followed by `(` is a known SQL keyword or function, never a column.
+
+    At completion, every deferred alias reference must have been matched, every bare
+    column name must belong to one of the tables referenced by the query, and every other
+    bare word must be a keyword, a function or an alias bound somewhere in the query.
+
+    Args:
+        index (SchemaIndex): The database schema.
+        max_cache_size (int): Maximum number of prefix states kept for resumption.
+        max_lookback (int): How many bytes back from the end of a query to look for a cached prefix state.
+    """
+
+    def __init__(self, index, max_cache_size=100_000, max_lookback=64):
+        super().__init__(vocabulary=list(range(256)))
+        self.index = index
+        self.max_cache_size = max_cache_size
+        self.max_lookback = max_lookback
+        self._states = OrderedDict()
+        # Calls may run concurrently in threads (see `ConcurrentPotential`).
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    async def prefix(self, context):
+        state = self._scan(bytes(context))
+        return 0.0 if self._prefix_ok(state) else float("-inf")
+
+    async def complete(self, context):
+        state = self._scan(bytes(context))
+        if state.quote is None:
+            state = self._decide(self._end_word(state, None), None)
+        return 0.0 if self._complete_ok(state) else float("-inf")
+
+    def _prefix_ok(self, state):
+        if state.failed:
+            return False
+        if not state.word or state.quote is not None:
+            return True
+        word = state.word.decode("latin-1").lower()
+        if state.qualifier is not None:
+            if state.qualifier in state.aliases or not self.index.is_table(
+                state.qualifier
+            ):
+                # Aliases may be rebound later (e.g. after `INTERSECT`), as in `_check_qualified`.
+                return word in self.index.column_prefixes
+            return word in self.index.table_column_prefixes[state.qualifier]
+        if state.expect == "table":
+            return word in self.index.table_prefixes
+        return True
+
+    def _complete_ok(self, state):
+        if state.failed or state.quote is not None or state.pending:
+            return False
+        if not state.unknown_words <= state.aliases.keys():
+            return False
+        return all(
+            any(self.index.has_column(t, c) for t in state.referenced_tables)
+            for c in state.bare_columns
+        )
+
+    def _scan(self, query):
+        """Return the scanner state after `query`, resuming from the longest cached prefix."""
+        with self._lock:
+            state = self._states.get(query)
+            if state is not None:
+                self._states.move_to_end(query)
+                return state
+
+            start, state = 0, _ScanState()
+            for cut in range(
+                len(query) - 1, max(len(query) - self.max_lookback, 0) - 1, -1
+            ):
+                cached = self._states.get(query[:cut])
+                if cached is not None:
+                    start, state = cut, cached
+                    break
+
+        # States are immutable, so the scan itself needs no lock.
+        for b in query[start:]:
+            if state.failed:
+                break
+            state = self._step(state, b)
+
+        with self._lock:
+            self._states[query] = state
+            if len(self._states) > self.max_cache_size:
+                self._states.popitem(last=False)
+        return state
+
+    def _step(self, state, b):
+        if state.quote is not None:
+            return replace(state, quote=None) if b == state.quote else state
+        if state.undecided is not None and b not in _SPACE_BYTES:
+            state = self._decide(state, b)
+        if b in _IDENT_BYTES:
+            return replace(state, word=state.word + bytes([b]))
+        if not state.word and state.qualifier is not None:
+            state = replace(state, qualifier=None)  # e.g. `T1.*`
+        else:
+            state = self._end_word(state, b)
+        if b in b"'\"":
+            return replace(state, quote=b)
+        if b == ord(","):
+            if state.in_from:
+                # A new item of the FROM list, whether or not the last one had an alias.
+                return replace(state, expect="table")
+            return replace(state, expect=None)
+        if b == ord("("):
+            return replace(state, expect=None, in_from=False)
+        return state
+
+    def _end_word(self, state, terminator):
+        """Classify the identifier in `state.word`, which ended at byte `terminator`."""
+        if not state.word:
+            return state
+        word = state.word.decode("latin-1").lower()
+        state = replace(state, word=b"")
+
+        if word[0].isdigit():
+            return replace(state, qualifier=None)
+
+        if terminator == ord(".") and state.qualifier is None:
+            return replace(state, qualifier=word, expect=None)
+
+        if state.qualifier is not None:
+            return self._check_qualified(
+                replace(state, qualifier=None), state.qualifier, word
+            )
+
+        if state.expect == "table":
+            if not self.index.is_table(word):
+                return replace(state, failed=True)
+            return replace(
+                state,
+                expect="alias?",
+                last_table=word,
+                referenced_tables=state.referenced_tables | {word},
+            )
+
+        if state.expect == "alias" or (
+            state.expect == "alias?" and word not in _NOT_ALIASES
+        ):
+            # Only aliases in a FROM clause name tables; others name result columns.
+            table = state.last_table if state.in_from else None
+            return self._bind_alias(replace(state, expect=None), word, table)
+
+        if word == "as":
+            return replace(state, expect="alias")
+        if word in _TABLE_KEYWORDS:
+            return replace(state, expect="table", in_from=True)
+        if word in _CLAUSE_KEYWORDS:
+            return replace(state, expect=None, in_from=False)
+
+        state = replace(state, expect=None)
+        if terminator in _SPACE_BYTES:
+            # Wait for the next byte: `count (*)` is a call, not a column.
+            return replace(state, undecided=word)
+        return self._bare_word(state, word, terminator)
+
+    def _decide(self, state, next_byte):
+        """Classify the bare word left undecided, now that `next_byte` follows it."""
+        if state.undecided is None:
+            return state
+        word = state.undecided
+        return self._bare_word(replace(state, undecided=None), word, next_byte)
+
+    def _bare_word(self, state, word, next_byte):
+        if next_byte == ord("("):
+            return state if word in _SQL_WORDS else replace(state, failed=True)
+        if word in state.aliases:
+            return state
+        if word in self.index.columns:
+            return replace(state, bare_columns=state.bare_columns | {word})
+        if word in _SQL_WORDS:
+            return state
+        # Possibly an alias bound later in the query; checked at completion.
+        return replace(state, unknown_words=state.unknown_words | {word})
+
+    def _resolve(self, state, qualifier):
+        if qualifier in state.aliases:
+            return state.aliases[qualifier]
+        if self.index.is_table(qualifier):
+            return qualifier
+        return None
+
+    def _check_qualified(self, state, qualifier, column):
+        table = self._resolve(state, qualifier)
+        if table is not None and self.index.has_column(table, column):
+            return state
+        if table is None and column not in self.index.columns:
+            return replace(state, failed=True)
+        if table is not None and qualifier not in state.aliases:
+            # A table name, not an alias, so it cannot be rebound later.
+            return replace(state, failed=True)
+        # Aliases such as `T1` are reused across subqueries; wait for a binding that fits.
+        return replace(state, pending=state.pending | {(qualifier, column)})
+
+    def _bind_alias(self, state, alias, table):
+        aliases = {**state.aliases, alias: table}
+        pending = state.pending
+        if table is not None:
+            pending = frozenset(
+                (q, c)
+                for q, c in pending
+                if not (q == alias and self.index.has_column(table, c))
+            )
+        return replace(state, aliases=aliases, pending=pending)
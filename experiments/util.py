@@ -1,6 +1,7 @@
 import numpy as np
+from collections import OrderedDict
 from genlm.eval.util import bootstrap_ci
-from genlm.control.sampler import EagerSetSampler, SetTokenSampler
+from genlm.control.sampler import EagerSetSampler, SetTokenSampler, TokenSampler
 
 
 class ImproperlyWeightedSetTokenSampler(SetTokenSampler):
@@ -13,6 +14,143 @@ def improperly_weighted_eager_token_sampler(llm, bool_cfg):
     return ImproperlyWeightedSetTokenSampler(EagerSetSampler(llm, bool_cfg))
 
 
+class FastForwardTokenSampler(TokenSampler):
+    """Wraps a token sampler to append grammar-forced tokens without sampling them.
+
+    Before each step, the bytes that `bool_cfg` forces after the current context (those
+    for which the grammar allows exactly one next byte and no EOS) are computed. If there
+    are any, they are split into tokens by greedy longest match over the LM vocabulary, and
+    the LM log-probabilities of the whole run are computed with one batched LM call. The
+    tokens of the run are then returned one per step with a log-probability of 0 and, if
+    `proper_weights`, their LM log-probability as weight (otherwise a weight of 0, and no
+    LM call is made). Steps without forced bytes are delegated to `sampler`.
+
+    The greedy tokenization is not the LM's own (BPE) tokenization, and it is the only one
+    proposed for forced bytes. Fast-forwarding therefore changes the posterior: samples are
+    properly weighted with respect to the target restricted to sequences that tokenize
+    forced spans greedily (and renormalized), not with respect to the target of the same
+    model without fast-forwarding, so results of the two are not directly comparable.
+
+    Forced bytes are cached per byte context, including contexts where nothing is forced.
+
+    Args:
+        sampler (genlm.control.TokenSampler): Sampler used when no bytes are forced.
+        llm (genlm.control.PromptedLLM): Language model.
+        bool_cfg (genlm.control.BoolCFG): Byte-level grammar of the fast potential.
+        proper_weights (bool): Whether forced tokens are weighted by their LM log-probability.
+        max_forced_bytes (int): Maximum number of forced bytes fast-forwarded at once.
+        max_cache_size (int): Maximum number of cached forced tokens, and of cached byte contexts.
+    """
+
+    def __init__(
+        self,
+        sampler,
+        llm,
+        bool_cfg,
+        proper_weights=True,
+        max_forced_bytes=256,
+        max_cache_size=10_000,
+    ):
+        super().__init__(sampler.target)
+        self.sampler = sampler
+        self.llm = llm
+        self.bool_cfg = bool_cfg
+        self.proper_weights = proper_weights
+        self.max_forced_bytes = max_forced_bytes
+        self.max_cache_size = max_cache_size
+        self.n_forced = 0
+        self._forced = OrderedDict()
+        self._forced_bytes = OrderedDict()
+        self._prompt_ids = None
+        self._tokens = {}
+        for token in llm.vocab:
+            self._tokens.setdefault(bytes(token), token)
+        self._max_token_length = max(map(len, self._tokens))
+
+    async def forced_bytes(self, context):
+        """Bytes that the grammar forces after `context`."""
+        key = b"".join(context)
+        forced = self._forced_bytes.get(key)
+        if forced is not None:
+            self._forced_bytes.move_to_end(key)
+            return forced
+
+        byte_context = list(key)
+        forced = []
+        while len(forced) < self.max_forced_bytes:
+            logws = await self.bool_cfg.logw_next(byte_context + forced)
+            allowed = np.flatnonzero(np.asarray(logws.weights) > float("-inf"))
+            if len(allowed) != 1 or allowed[0] == len(self.bool_cfg.vocab):
+                break
+            forced.append(self.bool_cfg.vocab_eos[allowed[0]])
+        forced = bytes(forced)
+
+        self._forced_bytes[key] = forced
+        if len(self._forced_bytes) > self.max_cache_size:
+            self._forced_bytes.popitem(last=False)
+        return forced
+
+    def tokenize(self, forced):
+        """Greedy longest-match tokenization of `forced` (not the LM's BPE), stopping at bytes no token covers."""
+        tokens, i = [], 0
+        while i < len(forced):
+            for j in range(min(len(forced), i + self._max_token_length), i, -1):
+                token = self._tokens.get(forced[i:j])
+                if token is not None:
+                    break
+            else:
+                break
+            tokens.append(token)
+            i = j
+        return tokens
+
+    async def sample(self, context, draw=None):
+        if self.proper_weights and self.llm.prompt_ids != self._prompt_ids:
+            # Cached weights are conditioned on the prompt.
+            self._forced.clear()
+            self._prompt_ids = list(self.llm.prompt_ids)
+        forced = self._forced.get(tuple(context))
+        if forced is None:
+            tokens = self.tokenize(await self.forced_bytes(context))
+            if not tokens:
+                if draw is None:
+                    return await self.sampler.sample(context)
+                return await self.sampler.sample(context, draw=draw)
+            forced = await self._fast_forward(list(context), tokens)
+        self.n_forced += 1
+        token, logw = forced
+        return token, logw, 0.0
+
+    async def _fast_forward(self, context, tokens):
+        contexts = [context + tokens[:i] for i in range(len(tokens))]
+        if self.proper_weights:
+            logws = (await self.llm.batch_logw_next(contexts)).weights
+            weights = [
+                float(logws[i, self.llm.lookup[token]])
+                for i, token in enumerate(tokens)
+            ]
+        else:
+            weights = [0.0] * len(tokens)
+        for ctx, token, logw in zip(contexts, tokens, weights):
+            self._forced[tuple(ctx)] = (token, logw)
+        while len(self._forced) > self.max_cache_size:
+            self._forced.popitem(last=False)
+        return tokens[0], weights[0]
+
+    async def cleanup(self):
+        await self.sampler.cleanup()
+
+
+def fast_forward_token_sampler(sampler, llm, bool_cfg):
+    """Wrap `sampler` in a `FastForwardTokenSampler`, keeping its weighting scheme."""
+    return FastForwardTokenSampler(
+        sampler,
+        llm,
+        bool_cfg,
+        proper_weights=not isinstance(sampler, ImproperlyWeightedSetTokenSampler),
+    )
+
+
 def mean_ci_results(results, ci=0.95, n_bootstrap=10000):
     return mean_ci(
         [r["weighted_accuracy"] for rs in results["all_instance_results"] for r in rs],